@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from hashlib import blake2b
+
+
+def table_digest(l: list[int]) -> str:
+    """Computes a digest of the contents of a lookup table, used as part of the cache key
+    so that the (possibly huge) table itself does not have to be stored in the key.
+
+    Exemple:
+    -
+    `table_digest([0, 3, 6, 9]) == table_digest([0, 3, 6, 9])`
+
+    Args:
+        l (list[int]): the table entries.
+
+    Returns:
+        digest(str): an hexadecimal digest of the table.
+    """
+    h = blake2b(digest_size=16)
+    for value in l:
+        h.update(str(value).encode())
+        h.update(b",")
+    return h.hexdigest()
+
+
+class LookupCache:
+    """In-process LRU cache of built QROM circuits and their inverses.
+
+    Entries are keyed on `(window_size, outBits, table digest, optimization)`. When the cache holds
+    more than `maxsize` entries the least recently used one is evicted, `maxsize = None` makes the
+    cache unbounded and `maxsize = 0` disables it.
+
+    Exemple:
+    -
+    `cache = LookupCache(maxsize=64)`
+
+    `compute_lookup_table_pair(6, 32, table, optimization=1, cache=cache)`
+
+    `cache.stats() -> {'hits': 0, 'misses': 1, 'evictions': 0, 'size': 1, 'maxsize': 64}`
+
+    Args:
+        maxsize (int | None): maximum number of stored entries, `default = 128`.
+    """
+
+    def __init__(self, maxsize: int | None = 128):
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must be a non negative integer or None.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(window_size: int, outBits: int, l: list[int], optimization: int, *extra) -> tuple:
+        """Builds the key used to store a lookup, `extra` holds any other build option that changes the circuit."""
+        return (window_size, outBits, table_digest(l), optimization) + tuple(extra)
+
+    def get(self, key: tuple):
+        """Returns the stored value for `key` (marking it as the most recently used) or `None`."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, value) -> None:
+        """Stores `value` under `key`, evicting the least recently used entries if needed."""
+        if self.maxsize == 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while self.maxsize is not None and len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int | None) -> None:
+        """Changes the maximum number of entries, evicting the least recently used ones if needed."""
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must be a non negative integer or None.")
+        self.maxsize = maxsize
+        while self.maxsize is not None and len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Removes every entry and resets the statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        """Returns the hit/miss statistics of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -1,170 +1,480 @@
+import os
 import sys
-import random
 import copy
+import json
 import time
+import argparse
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from math import log, factorial
-from sympy.combinatorics.permutations import Permutation, Cycle
+from fractions import Fraction
+import numpy as np
+
+
+class PermutacaoArray:
+    def __init__(self, array_form):
+        """
+            Permutação de `size` elementos guardada em vetores do NumPy, com a mesma semântica da
+            `sympy.combinatorics.Permutation` nas operações usadas pelos algoritmos de ciclos: `pi(i)` é a imagem de
+            i e `pi * q` aplica pi e depois q.
+
+            O vetor inverso (a posição de cada valor) é mantido junto do vetor da permutação, de forma que aplicar
+            uma transposição com `troca` custa O(1). A decomposição em ciclos é calculada apenas quando pedida e fica
+            guardada até a próxima alteração.
+
+            As buscas avaliam os movimentos candidatos sem aplicá-los: `delta_distancia` e `delta_P` calculam, em
+            O(1), a variação de `dh_perm_perm` e de `P` causada por uma transposição.
+        :param array_form: A imagem de cada elemento, `array_form[i] = pi(i)`.
+        """
+        self.array = np.array(array_form, dtype=np.int64)
+        self.inversa = np.empty_like(self.array)
+        self.inversa[self.array] = np.arange(len(self.array), dtype=np.int64)
+        self._ciclos = None
+        self._estrutura = None
+
+    @classmethod
+    def _de_vetores(cls, array, inversa):
+        pi = cls.__new__(cls)
+        pi.array = array
+        pi.inversa = inversa
+        pi._ciclos = None
+        pi._estrutura = None
+        return pi
+
+    @classmethod
+    def identidade(cls, size):
+        return cls(np.arange(size, dtype=np.int64))
+
+    @classmethod
+    def de_ciclo(cls, ciclo, size):
+        """
+        Permutação de `size` elementos formada por um único ciclo, `ciclo[k] -> ciclo[k+1]`.
+        """
+        array = np.arange(size, dtype=np.int64)
+        array[list(ciclo)] = np.roll(np.array(ciclo, dtype=np.int64), -1)
+        return cls(array)
+
+    @classmethod
+    def de_ordem(cls, size, ordem):
+        """
+        A permutação de `size` elementos na posição `ordem` da ordem lexicográfica (o inverso de `rank`).
+        """
+        restantes = list(range(size))
+        array = []
+        for i in range(size - 1, -1, -1):
+            indice, ordem = divmod(ordem, factorial(i))
+            array.append(restantes.pop(indice))
+        return cls(array)
+
+    @property
+    def size(self):
+        return len(self.array)
+
+    @property
+    def array_form(self):
+        return self.array.tolist()
+
+    @property
+    def cyclic_form(self):
+        """
+        Os ciclos de tamanho maior que 1, cada um começando pelo seu menor elemento e em ordem crescente dele (a
+        mesma forma da `sympy`).
+        """
+        if self._ciclos is None:
+            imagem = self.array.tolist()
+            visitados = [False] * len(imagem)
+            ciclos = []
+            for i in range(len(imagem)):
+                if visitados[i] or imagem[i] == i:
+                    continue
+                ciclo = [i]
+                visitados[i] = True
+                j = imagem[i]
+                while j != i:
+                    ciclo.append(j)
+                    visitados[j] = True
+                    j = imagem[j]
+                ciclos.append(ciclo)
+            self._ciclos = ciclos
+        return self._ciclos
+
+    def _estrutura_ciclos(self):
+        """
+        Para cada elemento fora dos pontos fixos: o seu ciclo e a sua posição nele; para cada ciclo: as somas
+        acumuladas das distâncias de Hamming dh(x, pi(x)) ao longo do ciclo (a última é o S do ciclo).
+        """
+        if self._estrutura is None:
+            ciclo_de = dict()
+            acumuladas = list()
+            for indice, ciclo in enumerate(self.cyclic_form):
+                soma = 0
+                somas = [0]
+                for posicao, x in enumerate(ciclo):
+                    ciclo_de[x] = (indice, posicao)
+                    soma += dh_int_int(x, ciclo[posicao + 1 - len(ciclo)])
+                    somas.append(soma)
+                acumuladas.append(somas)
+            self._estrutura = (ciclo_de, acumuladas)
+        return self._estrutura
+
+    def delta_distancia(self, a, b):
+        """
+        Variação de `dh_perm_perm(pi)` causada pela transposição dos valores a e b (`pi * swap(a, b)`), sem aplicá-la:
+        apenas as posições de a e de b mudam.
+        """
+        posicao_a = self.inversa.item(a)
+        posicao_b = self.inversa.item(b)
+        antes = (a ^ posicao_a).bit_count() + (b ^ posicao_b).bit_count()
+        depois = (b ^ posicao_a).bit_count() + (a ^ posicao_b).bit_count()
+        return depois - antes
+
+    def delta_P(self, a, b):
+        """
+            Variação (exata) de `P(pi)` causada pela transposição dos valores a e b, sem aplicá-la.
+
+            Sendo pa e pb as posições de a e b, a transposição faz pa -> b e pb -> a: quando a e b estão no mesmo
+            ciclo ele se divide em (a ... pb) e (b ... pa), caso contrário os seus ciclos se unem. Os S dos novos
+            ciclos saem das somas acumuladas de `_estrutura_ciclos`, e os pontos fixos são ciclos de tamanho 1 com
+            S = 0.
+        """
+        ciclo_de, acumuladas = self._estrutura_ciclos()
+        posicao_a = self.inversa.item(a)
+        posicao_b = self.inversa.item(b)
+        ciclo_a, indice_a = ciclo_de.get(a, (None, 0))
+        ciclo_b, indice_b = ciclo_de.get(b, (None, 0))
+
+        if ciclo_a is not None and ciclo_a == ciclo_b:
+            somas = acumuladas[ciclo_a]
+            tamanho = len(somas) - 1
+            s_total = somas[-1]
+
+            # (a ... pb): os elementos a partir de a, antes de b
+            tamanho_a = (indice_b - indice_a) % tamanho
+            fim = indice_a + tamanho_a
+            if fim <= tamanho:
+                s_trecho = somas[fim] - somas[indice_a]
+            else:
+                s_trecho = s_total - somas[indice_a] + somas[fim - tamanho]
+
+            s_a = s_trecho - dh_int_int(posicao_b, b) + dh_int_int(posicao_b, a)
+            s_b = s_total - s_trecho - dh_int_int(posicao_a, a) + dh_int_int(posicao_a, b)
+            return Fraction(s_a, tamanho_a) + Fraction(s_b, tamanho - tamanho_a) - Fraction(s_total, tamanho)
+
+        tamanho_a = 1 if ciclo_a is None else len(acumuladas[ciclo_a]) - 1
+        tamanho_b = 1 if ciclo_b is None else len(acumuladas[ciclo_b]) - 1
+        s_a = 0 if ciclo_a is None else acumuladas[ciclo_a][-1]
+        s_b = 0 if ciclo_b is None else acumuladas[ciclo_b][-1]
+
+        s_unido = s_a + s_b - dh_int_int(posicao_a, a) - dh_int_int(posicao_b, b) \
+            + dh_int_int(posicao_a, b) + dh_int_int(posicao_b, a)
+        return Fraction(s_unido, tamanho_a + tamanho_b) - Fraction(s_a, tamanho_a) - Fraction(s_b, tamanho_b)
+
+    def copia(self):
+        return PermutacaoArray._de_vetores(self.array.copy(), self.inversa.copy())
+
+    def troca(self, a, b):
+        """
+        Aplica, no próprio lugar, a transposição dos valores a e b (pi <- pi * (a b)) em O(1).
+        """
+        posicao_a = self.inversa[a]
+        posicao_b = self.inversa[b]
+        self.array[posicao_a] = b
+        self.array[posicao_b] = a
+        self.inversa[a] = posicao_b
+        self.inversa[b] = posicao_a
+        self._ciclos = None
+        self._estrutura = None
+        return self
+
+    def rank(self):
+        """
+        Posição da permutação na ordem lexicográfica.
+        """
+        ordem = 0
+        size = self.size
+        for i in range(size - 1):
+            menores = int(np.count_nonzero(self.array[i + 1:] < self.array[i]))
+            ordem += menores * factorial(size - 1 - i)
+        return ordem
+
+    def proxima(self):
+        """
+        A permutação seguinte na ordem lexicográfica (a mesma de `pi + 1`), calculada em O(size).
+        """
+        array = self.array.tolist()
+        i = len(array) - 2
+        while i >= 0 and array[i] > array[i + 1]:
+            i -= 1
+        if i < 0:
+            return PermutacaoArray.identidade(len(array))
+        j = len(array) - 1
+        while array[j] < array[i]:
+            j -= 1
+        array[i], array[j] = array[j], array[i]
+        array[i + 1:] = array[:i:-1]
+        return PermutacaoArray(array)
+
+    def __call__(self, i):
+        return int(self.array[i])
+
+    def __iter__(self):
+        return iter(self.array.tolist())
+
+    def __mul__(self, other):
+        # uma tupla (a, b) é a transposição dos valores a e b, veja `swap`
+        if isinstance(other, tuple):
+            return self.copia().troca(*other)
+        array = other.array[self.array]
+        inversa = self.inversa[other.inversa]
+        return PermutacaoArray._de_vetores(array, inversa)
+
+    def __add__(self, other):
+        return PermutacaoArray.de_ordem(self.size, (self.rank() + other) % factorial(self.size))
+
+    def __eq__(self, other):
+        return isinstance(other, PermutacaoArray) and np.array_equal(self.array, other.array)
+
+    def __hash__(self):
+        return hash(self.array.tobytes())
+
+    def __str__(self):
+        ciclos = self.cyclic_form
+        if not ciclos:
+            return '()'
+        return ''.join('(' + ' '.join(str(x) for x in ciclo) + ')' for ciclo in ciclos)
+
+    def __repr__(self):
+        return f'PermutacaoArray({self.array_form})'
+
+
+def fase_gulosa(fi, matriz, n):
+    """
+        Fase inicial da síntese: aplica, enquanto diminuírem a distância de Hamming, as portas de `matriz` (as portas
+        com menos controles primeiro).
+    :return: A permutação restante e a quantidade de portas aplicadas.
+    """
+    countPorts = 0
+    nc = 0
+    inicio = 0
+    while nc < (n-1):
+        temp  = fi
+        sinal = 0
+        lim = (combinacao(n-1,nc)*(2**(nc)))    # quantidade de possiveis portas com nc controles
+        for i in range(int(lim)):
+            for j in range(n):
+                piaux = fi * matriz[inicio+i][j]
+                if dh_perm_perm(piaux) < dh_perm_perm(temp):
+                    temp = piaux
+                    sinal = 1
+        if sinal == 0:
+            nc += 1
+            inicio += int(lim)
+        else:
+            countPorts += 1
+        fi = temp
+    return fi, countPorts
+
+
+def distancias(pi, matriz, n):
+    """
+        Quantidade de portas da síntese de pi (`fase_gulosa` seguida de `calcula_dist`) e a da síntese
+        bidirecional, a menor entre a de pi e a da sua inversa. A síntese que falha resulta em 0.
+    """
+    dist = calcula_dist(*fase_gulosa(pi, matriz, n))
+    dist2 = calcula_dist(*fase_gulosa(PermutacaoArray(inv(n, pi)), matriz, n))
+    return dist, min(dist, dist2)
+
+
+_matrizes = dict()
+
+
+def obtem_matriz(n):
+    # a matriz de portas é calculada uma única vez em cada processo
+    if n not in _matrizes:
+        _matrizes[n] = matriz_perm(n)
+    return _matrizes[n]
+
+
+def permutacao_da_amostra(n, semente, indice):
+    """
+    A permutação aleatória de número `indice` da amostragem: depende apenas da semente e do índice, de forma que a
+    amostra não muda com a divisão em blocos ou com a retomada.
+    """
+    return PermutacaoArray(np.random.default_rng([semente, indice]).permutation(2**n))
+
+
+def processa_intervalo(n, inicio, fim, semente=None):
+    """
+        Calcula as distâncias das permutações de posição (ordem lexicográfica) `inicio` a `fim - 1`, ou das amostras
+        `inicio` a `fim - 1` quando a semente é informada.
+    :return: O intervalo, os histogramas (quantidade de portas -> quantidade de permutações) da síntese
+        unidirecional e bidirecional, e as posições das permutações que a síntese não resolveu.
+    """
+    matriz = obtem_matriz(n)
+    iota = PermutacaoArray.identidade(2**n)
+    unidirecional = Counter()
+    bidirecional = Counter()
+    falhas = []
+
+    pi = None
+    for posicao in range(inicio, fim):
+        if semente is not None:
+            pi = permutacao_da_amostra(n, semente, posicao)
+        elif pi is None:
+            pi = PermutacaoArray.de_ordem(2**n, posicao)
+        else:
+            pi = pi.proxima()
+
+        dist, dist_b = distancias(pi, matriz, n)
+        if dist_b == 0 and pi != iota:
+            falhas.append(posicao)
+            continue
+        unidirecional[dist] += 1
+        bidirecional[dist_b] += 1
+
+    return inicio, fim, unidirecional, bidirecional, falhas
+
+
+def une_intervalos(intervalos):
+    unidos = []
+    for inicio, fim in sorted(intervalos):
+        if unidos and inicio <= unidos[-1][1]:
+            unidos[-1][1] = max(unidos[-1][1], fim)
+        else:
+            unidos.append([inicio, fim])
+    return unidos
+
+
+def salva_progresso(arquivo, progresso):
+    # escrita atômica, um processo interrompido nunca deixa o arquivo pela metade
+    diretorio = os.path.dirname(os.path.abspath(arquivo))
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(descritor, 'w') as f:
+            json.dump(progresso, f)
+        os.replace(temporario, arquivo)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+        raise
+
+
+def censo(n, processos=None, bloco=1000, arquivo=None, amostras=None, semente=0, mostra_progresso=True):
+    """
+        Censo das distâncias (quantidade de portas) das permutações de n bits: exaustivo, pela posição de cada uma das
+        (2^n)! permutações na ordem lexicográfica, ou por amostragem de permutações aleatórias (para n >= 4).
+
+        As posições são divididas em blocos de `bloco` permutações, processados em paralelo. Com um arquivo de
+        progresso, os intervalos concluídos e os histogramas acumulados são gravados a cada bloco, e uma execução
+        interrompida continua de onde parou.
+    :param n: Quantidade de bits.
+    :param processos: Quantidade de processos, `None` ou 1 processa os blocos no próprio processo.
+    :param bloco: Quantidade de permutações de cada bloco.
+    :param arquivo: Arquivo (JSON) de progresso, `None` não grava o progresso.
+    :param amostras: Quantidade de permutações aleatórias, `None` faz o censo exaustivo.
+    :param semente: Semente da amostragem.
+    :param mostra_progresso: Imprime o andamento a cada bloco concluído.
+    :return: Dicionário com os histogramas `unidirecional` e `bidirecional`, as `falhas` e o `total` de posições.
+    """
+    if amostras is None:
+        if n >= 4:
+            raise ValueError('Exhaustive census is only feasible up to 3 bits, use sampling.')
+        total = factorial(2**n)
+        parametros = {'n': n, 'bloco': bloco, 'amostras': None, 'semente': None}
+        semente = None
+    else:
+        total = amostras
+        parametros = {'n': n, 'bloco': bloco, 'amostras': amostras, 'semente': semente}
+
+    progresso = {**parametros, 'concluidos': [], 'unidirecional': {}, 'bidirecional': {}, 'falhas': []}
+    if arquivo is not None and os.path.exists(arquivo):
+        with open(arquivo) as f:
+            progresso = json.load(f)
+        if any(progresso.get(chave) != valor for chave, valor in parametros.items()):
+            raise ValueError(f'Progress file {arquivo} belongs to a census with different parameters.')
+
+    unidirecional = Counter({int(d): c for d, c in progresso['unidirecional'].items()})
+    bidirecional = Counter({int(d): c for d, c in progresso['bidirecional'].items()})
+    falhas = list(progresso['falhas'])
+    concluidos = une_intervalos(progresso['concluidos'])
+
+    def concluido(inicio, fim):
+        return any(a <= inicio and fim <= b for a, b in concluidos)
+
+    pendentes = [(inicio, min(inicio + bloco, total)) for inicio in range(0, total, bloco)]
+    pendentes = [(inicio, fim) for inicio, fim in pendentes if not concluido(inicio, fim)]
+
+    start = time.time()
+    feitas = total - sum(fim - inicio for inicio, fim in pendentes)
+
+    def registra(resultado):
+        nonlocal concluidos, feitas
+        inicio, fim, uni, bi, erros = resultado
+        unidirecional.update(uni)
+        bidirecional.update(bi)
+        falhas.extend(erros)
+        concluidos = une_intervalos(concluidos + [[inicio, fim]])
+        feitas += fim - inicio
+
+        if arquivo is not None:
+            salva_progresso(arquivo, {
+                **parametros,
+                'concluidos': concluidos,
+                'unidirecional': {str(d): c for d, c in sorted(unidirecional.items())},
+                'bidirecional': {str(d): c for d, c in sorted(bidirecional.items())},
+                'falhas': sorted(falhas),
+            })
+        if mostra_progresso:
+            print(f'{feitas}/{total} ({time.time() - start:.1f} s)', flush=True)
+
+    if processos is None or processos <= 1:
+        for inicio, fim in pendentes:
+            registra(processa_intervalo(n, inicio, fim, semente))
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            futuros = [pool.submit(processa_intervalo, n, inicio, fim, semente) for inicio, fim in pendentes]
+            for futuro in as_completed(futuros):
+                registra(futuro.result())
+
+    return {
+        'unidirecional': dict(sorted(unidirecional.items())),
+        'bidirecional': dict(sorted(bidirecional.items())),
+        'falhas': sorted(falhas),
+        'total': total,
+    }
 
 
 def main(argv=None):
+    parser = argparse.ArgumentParser(description='Censo das distâncias das permutações de n bits.')
+    parser.add_argument('-n', type=int, default=3, help='quantidade de bits')
+    parser.add_argument('-p', '--processos', type=int, default=os.cpu_count(), help='quantidade de processos')
+    parser.add_argument('-b', '--bloco', type=int, default=1000, help='permutações por bloco')
+    parser.add_argument('-a', '--amostras', type=int, default=None,
+                        help='quantidade de permutações aleatórias (sem ela, o censo é exaustivo)')
+    parser.add_argument('-s', '--semente', type=int, default=0, help='semente da amostragem')
+    parser.add_argument('-c', '--progresso', default=None,
+                        help='arquivo de progresso, padrão algociclos_<n>bits[_<amostras>amostras].json')
+    args = parser.parse_args(argv)
+
+    arquivo = args.progresso
+    if arquivo is None:
+        sufixo = '' if args.amostras is None else f'_{args.amostras}amostras_s{args.semente}'
+        arquivo = f'algociclos_{args.n}bits{sufixo}.json'
+
     start = time.time()   # in seconds
-    f = open('algociclos_3bits.txt', mode='w')   # abre arquivo para imprimir as distâncias
-    b = open('algociclos_3bitsb.txt', mode='w')   # abre arquivo para imprimir as distâncias bid.
-    
-    n = 3
-    size = 2**n
-    iota = Permutation([], size=2**n)  # permutação Identidade para n bits
-    perm_list = set()
-    permutacoes = []
-
- # Pré-processamento - Matriz!   
-    matriz = matriz_perm(n)
-    for linha in matriz:
-        print(linha)    
-    print('----------------------------------------------') 
-
-    # Random
-##############################################################################################        
-##    while len(perm_list) < 1000:
-##        temp = list(range(2**n))  # temp = list(range(2**n))
-##        random.shuffle(temp)  # random.shuffle(temp)
-##        pi = Permutation(temp)
-###        print('temp = ', temp, ', pi = ', pi)
-##        perm_list.add(tuple(temp)) # `tuple` because `list`s are not hashable.
-##        
-##    permutacoes = sorted(perm_list)
-##    print('len(permutações) = ', len(permutacoes))
-##    
-##    contador = 0
-##
-##    for pi in permutacoes:           # para testar um conjunto de permutações    
-##        pi = Permutation(pi)
-##        sigma = Permutation(inv(n, pi))
-##        
-##        fi = pi
-##        countPorts = 0
-##                
-####        if contador == 100 or contador == 200 or contador == 300 or contador == 400 or contador == 500 or contador == 700 or contador == 900:
-####            print('contador = ', contador)
-####        contador += 1
-##        
-##        nc = 0
-##        inicio = 0
-##        while nc < (n-1):
-##            temp  = fi
-##            sinal = 0
-##            lim = (combinacao(n-1,nc)*(2**(nc)))    # quantidade de possiveis portas com nc controles
-##            for i in range(int(lim)):
-##                for j in range(n):
-##                    piaux = fi * matriz[inicio+i][j]
-##                    if dh_perm_perm(piaux) < dh_perm_perm(temp):
-##                        temp = piaux
-##                        sinal = 1
-##            if sinal == 0:
-##                nc += 1
-##                inicio += int(lim)
-##            else:
-##                countPorts += 1
-##            fi = temp
-##        
-##        dist = calcula_dist(fi, countPorts)
-##        if dist == 0 and pi != iota:
-##            print('Erro!! Não conseguiu resolver ', file=f, flush=True)
-##            print('Erro!! Não conseguiu resolver ', pi)
-##            break
-###        print('Total de Portas = ', dist)
-##        print(dist, file=f, flush=True)
-##        
-##########################################################################################################
-    pi = iota + 1
-    pi_final = iota    
-    sigma = Permutation(inv(n, pi))        
-    while pi != pi_final:           # para testar um conjunto de permutações        
-        fi = pi
-        countPorts = 0
-#        print(pi.rank(), ' ====> ', pi)
-
-        if pi.rank() == 100 or pi.rank() == 1000 or pi.rank() == 5000 or pi.rank() == 10000 or pi.rank() == 20000 or pi.rank() == 30000 or pi.rank() == 35000:
-            print('pi.rank() = ', pi.rank())
-        
-        nc = 0
-        inicio=0
-        while nc < (n-1):
-            temp  = fi
-            sinal = 0
-            lim = (combinacao(n-1,nc)*(2**(nc)))    # quantidade de possiveis portas com nc controles
-#            print('nc = ', nc, ' lim = ', lim)
-            for i in range(int(lim)):
-#                print('i = ', i)
-                for j in range(n):
-#                    print('j = ', j)
-                    piaux = fi * matriz[inicio+i][j]
-##                    print('piaux = fi * matriz[',i,'][',j,'] = ', fi, '*', matriz[i][j])
-##                    print('temp = ', temp, ' piaux = ', piaux, ' fi = ', fi)                   
-##                    print('dh(piaux) = ', dh_perm_perm(piaux),' dh(fi) = ',  dh_perm_perm(temp))
-                    if dh_perm_perm(piaux) < dh_perm_perm(temp):
-                        temp = piaux
-                        sinal = 1
-#                        print('sinal = ', sinal, 'temp = ', temp)
-            if sinal == 0:
-                nc += 1
-                inicio +=int(lim)
-            else:
-                countPorts += 1
-            fi = temp
-#                print('fi = ', fi,'\n countPorts = ', countPorts)
-                
-#        fi, countPorts = Not(fi, countPorts)
-#        fi, countPorts = CnNot3bits(fi, countPorts)                            
-        dist = calcula_dist(fi, countPorts)
-        
-        if dist == 0 and pi != iota:
-            print('Erro!! Não conseguiu resolver ', file=f, flush=True)
-            print('Erro!! Não conseguiu resolver ', pi)
-            break
-#        print('Total de Portas = ', dist)
-        print(dist, file=f)
-#        pi = pi_final           
-###################################################################################################
-################################################
-        fi = sigma
-        countPorts = 0
-        
-        nc = 0
-        inicio = 0
-        while nc < (n-1):
-            temp  = fi
-            sinal = 0
-            lim = (combinacao(n-1,nc)*(2**(nc)))    # quantidade de possiveis portas com nc controles
-            for i in range(int(lim)):
-                for j in range(n):
-                    piaux = fi * matriz[inicio+i][j]
-                    if dh_perm_perm(piaux) < dh_perm_perm(temp):
-                        temp = piaux
-                        sinal = 1
-            if sinal == 0:
-                nc += 1
-                inicio += int(lim)
-            else:
-                countPorts += 1
-            fi = temp
-        
-        dist2 = calcula_dist(fi, countPorts)
-
-        if dist2 < dist:
-            dist = dist2
-
-        if dist == 0 and pi != iota:
-            print('Erro!! Não conseguiu resolver ', file=b, flush=True)
-            print('Erro!! Não conseguiu resolver ', pi)
-            break       
-        print(dist, file=b)
-
-#        pi = pi_final
-              
-        pi = pi+1
-        sigma = Permutation(inv(n, pi)) 
-              
+    resultado = censo(args.n, args.processos, args.bloco, arquivo, args.amostras, args.semente)
+
+    for nome in ('unidirecional', 'bidirecional'):
+        histograma = resultado[nome]
+        quantidade = sum(histograma.values())
+        media = sum(d * c for d, c in histograma.items()) / quantidade if quantidade else 0
+        print(f'{nome}: média = {media:.4f}')
+        for d, c in histograma.items():
+            print(f'  {d:4d} portas: {c}')
+    if resultado['falhas']:
+        print('Erro!! Não conseguiu resolver', len(resultado['falhas']), 'permutações:', resultado['falhas'][:10])
+
     end = time.time()
     print(end - start)    # in seconds
 ###################################################################
@@ -178,7 +488,7 @@ def inv(n, perm):
 def calcula_dist(pi, countPorts):
     n = int(log(pi.size, 2))
     size = pi.size
-    iota = Permutation([], size=2**n)
+    iota = PermutacaoArray.identidade(2**n)
    # countPorts = 0     # conta o número de portas usadas
     
     while pi != iota:
@@ -301,29 +611,26 @@ def matriz_perm(n):
 
 
 # Procura 1o um 2-move T que junta ciclos (P(pi*T)>P(pi)), caso não exista, procura um 2-move que separa ciclos, senão retorna None
+# Os candidatos são avaliados pelas variações de dh e de P (O(1) cada), apenas o movimento escolhido é aplicado
 def search_2move(pi):
 #    print('Entrou em 2-move')
-    iota = Permutation([], size=pi.size)
-    T_temp = iota
     n = int(log(pi.size, 2))
     dmin = pi.size
-    pi_return = None
+    T_return = None
     for cycle in pi.cyclic_form:
-        for element in cycle:
-            for i in range(len(cycle)):
-                if element == cycle[i]:
-                    d_atual= dh_int_int(cycle[i-1], cycle[i])
+        for i, element in enumerate(cycle):
+            d_atual = dh_int_int(cycle[i-1], element)
             for neighbor in neighbors(element, n):
-                piaux = pi*swap(element, neighbor)
-                if dh_perm_perm(piaux) < dh_perm_perm(pi): # verifica se há 2-move
-                    if pi_return == None:   # verifica se é o 1o 2-move encontrado
-                        pi_return = piaux
-                    if P(piaux) > P(pi) and d_atual < dmin: # verifica se o 2-move junta ciclos e se a d.h. entre os vizinhos tratados é mínima
+                if pi.delta_distancia(element, neighbor) < 0: # verifica se há 2-move
+                    if T_return == None:   # verifica se é o 1o 2-move encontrado
+                        T_return = swap(element, neighbor)
+                    if d_atual < dmin and pi.delta_P(element, neighbor) > 0: # verifica se o 2-move junta ciclos e se a d.h. entre os vizinhos tratados é mínima
                         dmin = d_atual
-                        pi_return = piaux
+                        T_return = swap(element, neighbor)
 #                    print('Porta trocando ', element, ' com ', neighbor, ' eh 2-move')
-                    T_temp = swap(element, neighbor)
-    return pi_return
+    if T_return == None:
+        return None
+    return pi*T_return
 
 
 # Procura um 0-move que junta ciclos
@@ -331,21 +638,19 @@ def search_0move(pi):
 #    print('Entrou em 0-move')
     n = int(log(pi.size,2))
     dmin = pi.size
-    pi_return = None
+    T_return = None
     for cycle in pi.cyclic_form:
-        for element in cycle:
-            for i in range(len(cycle)):
-                if element == cycle[i]:
-                    d_atual = dh_int_int(cycle[i-1], cycle[i])
+        for i, element in enumerate(cycle):
+            d_atual = dh_int_int(cycle[i-1], element)
             for neighbor in neighbors(element, n):
-                piaux = pi*swap(element, neighbor)
-                if dh_perm_perm(piaux) == dh_perm_perm(pi) and P(piaux) < P(pi):
-                    if d_atual < dmin:
-                        dmin = d_atual
-                        pi_return = piaux
+                if d_atual < dmin and pi.delta_distancia(element, neighbor) == 0 and pi.delta_P(element, neighbor) < 0:
+                    dmin = d_atual
+                    T_return = swap(element, neighbor)
 ##                    print('Porta  trocando ', element, ' com ', neighbor,\
 ##                        ' eh 0-move')
-    return pi_return
+    if T_return == None:
+        return None
+    return pi*T_return
 
     # Verifica se, num ciclo, há uma sequencia de 0-moves que termine com um 2-move.
     # Em caso afirmativo, aplica tal sequencia.
@@ -368,9 +673,9 @@ def search_seq(pi):
 #p#                print('!!',beginSeq,endSeq)
                 if endSeq < len(cycle):           # há pelo menos 2 com dist > 1
                     if dh_int_int(cycle[beginSeq], cycle[endSeq]) == 1:       # para garantir que o último movimento seja 2-move
-                        piaux = pi
+                        piaux = pi.copia()
                         for j in range(beginSeq+1, endSeq):
-                            piaux = piaux*swap(cycle[j], cycle[j+1])            # não necessariamente 0-move
+                            piaux.troca(*swap(cycle[j], cycle[j+1]))            # não necessariamente 0-move
                             countPorts += 1 
 ##                            print('         2a:(',countPorts,'):',piaux);
 ##                        print(cycle, beginSeq, endSeq)
@@ -381,21 +686,21 @@ def search_seq(pi):
 #p#                        print('         continua tentando...')
         if beginSeq == len(cycle):        # se todas as distâncias entre vizinhos são 1, desmonta todo ciclo 
 #p#            print('Desmonta ciclo ',cycle)
-            piaux = pi
+            piaux = pi.copia()
             for i in range(len(cycle)-1):
-                piaux = piaux*swap(cycle[i-1], cycle[i])
+                piaux.troca(*swap(cycle[i-1], cycle[i]))
                 countPorts += 1
 #                print('         0:(',countPorts,'):',piaux);
             return piaux, countPorts
         elif endSeq == len(cycle):      # se houver apenas uma distância diferente de 1, desmonta todo ciclo
 #p#            print('Desmonta ciclo ',cycle)
-            piaux = pi
+            piaux = pi.copia()
             for i in range(beginSeq+1, len(cycle)-1):
-                piaux = piaux*swap(cycle[i], cycle[i+1])
+                piaux.troca(*swap(cycle[i], cycle[i+1]))
                 countPorts += 1
 #                print('         1:(',countPorts,'):',piaux);
             for i in range(beginSeq+1):
-                piaux = piaux*swap(cycle[i-1], cycle[i])
+                piaux.troca(*swap(cycle[i-1], cycle[i]))
                 countPorts += 1
 #                print('         1:(',countPorts,'):',piaux);
 #            print('Portas em seq = ', countPorts)
@@ -405,20 +710,15 @@ def search_seq(pi):
 
 # função 2moveD baseada na 2move original
 def search_2moveD(pi):
-    iota = Permutation([], size = pi.size)
-    T_temp = iota
     n = int(log(pi.size,2))
     dmin = pi.size
     pi_return = None
     for cycle in pi.cyclic_form:
-        for element in cycle:
-            for i in range(len(cycle)):
-                if element == cycle[i]:
-                    d_atual = dh_int_int(cycle[i-1], cycle[i])
+        for i, element in enumerate(cycle):
+            d_atual = dh_int_int(cycle[i-1], element)
             for neighbor in neighbors(element, n):
-                piaux = pi * swap(element, neighbor)
-                if dh_perm_perm(piaux) < dh_perm_perm(pi) and (neighbor in cycle): # verifica se há 2-moveD
-                    pi_return = piaux
+                if pi.delta_distancia(element, neighbor) < 0 and (neighbor in cycle): # verifica se há 2-moveD
+                    pi_return = pi * swap(element, neighbor)
                     return pi_return
 ##                    if P(piaux) > P(pi) and d_atual < dmin: # verifica se o 2-move junta ciclos e se a d.h. entre os vizinhos tratados é mínima
 ##                        dmin = d_atual
@@ -463,7 +763,7 @@ def CnNot3bits(pi, countPorts):
                 a[(j2+2)%3] = j1
                 for i in range(pi.size): #aplica a porta em todos os elementos de pi
                     temp[i] = CnNot(pi(i),a)
-                pi_temp = Permutation(temp)
+                pi_temp = PermutacaoArray(temp)
                 if dh_perm_perm(pi_temp) < dh_perm_perm(pi):
                     countPorts = countPorts + 1
                     pi = pi_temp #atualiza pi
@@ -507,7 +807,7 @@ def Not(pi, countPorts):
             for j in range(size):
                 temp[j] = temp[j] ^ mask
             countPorts += 1       
-    pi = Permutation(temp)
+    pi = PermutacaoArray(temp)
     pi_return = pi
     return pi_return, countPorts
 
@@ -518,6 +818,7 @@ def replace(pi, j, i, count):
     indice = 0
     pi_return = []
     i_line = 0
+    pi = pi.copia()     # as trocas são aplicadas no próprio lugar
 #    i_old = 0 
     while dh_int_int(i, j)!=1:            # Enquanto não puder colocar j na sua posição, faz (i <- i')
         x = i ^ j
@@ -532,21 +833,20 @@ def replace(pi, j, i, count):
             k += 1
         i_line = i ^ (2**(indice))
         #    print('i: ', i, 'i_line: ', i_line)
-        piaux = pi*swap(i,i_line)
+        pi.troca(*swap(i,i_line))
         count += 1
 #        print('A Porta ', 'T(', i,',', i_line,') eh aplicada quando dh_int_int(i,j)!=1')
 #        print('count: ', count, ', piaux: ', piaux)
 #        print('Se é !=, count: ', count)
 #        i_old = i
         i = i_line
-        pi = piaux     
 #    print('Temos que dh_int_int(',i,',',j,'): ',dh_int_int(i, j))
-    pi_return = pi*swap(i, j)
-    count += 1
-    if dh_perm_perm(pi_return) < dh_perm_perm(pi):
+    if pi.delta_distancia(i, j) < 0:
         dm = 1
     else:
         dm = 0          
+    pi_return = pi.troca(*swap(i, j))
+    count += 1
 #    print('A Porta ', 'T(', i,',', j,') eh aplicada em replace pois dh_int_int(i,j)==1')
 #    print('Se é ==, count: ', count)
 #    print('count: ', count, ', pi_return: ', pi_return, 'dm: ', dm)
@@ -555,7 +855,7 @@ def replace(pi, j, i, count):
 
 def seq2perm(seq, n):
     a = b = 0
-    p = Permutation([], size=2**n)
+    p = PermutacaoArray.identidade(2**n)
     for i in range(n):
         if seq[i] == 1:
             a += 0*2**i
@@ -566,7 +866,7 @@ def seq2perm(seq, n):
         elif seq[i] == 3:
             a += 1*2**i
             b += 1*2**i
-    p = Permutation(a, b)        
+    p.troca(a, b)
     return p
 
 
@@ -632,41 +932,37 @@ def neighbors(a, size):
 def dh_perm_perm(p, q=None):
     
     if q is None:
-        q = Permutation([], size=p.size)
+        q = np.arange(p.size, dtype=np.int64)
     elif p.size != q.size:
         raise ValueError('permutations must be of same sizes')
+    else:
+        q = q.array
 
-    dist = 0
-    for i in range(p.size):
-        pi = p.array_form[i]
-        qi = q.array_form[i]
-        dist += dh_int_int(pi, qi)
-
-    return dist
+    return int(np.bitwise_count(p.array ^ q).sum())
 
 
 def dh_perm_int(p, a):
-    return dh_int_int(p.array_form[a], a)
+    return dh_int_int(p(a), a)
 
 
 def dh_int_int(a, b, bits = 64):
-    x = a ^ b
-    return sum((x >> i & 1) for i in range(bits))
+    x = (a ^ b) & ((1 << bits) - 1)
+    return x.bit_count()
 
 
 # aplica a transposição na permutação se a dist. Hamming for 1
 def swap(i, j):
     if dh_int_int(i, j) == 1:
-        return Permutation(i, j)
+        return (i, j)   # veja PermutacaoArray.__mul__
     else:
         raise ValueError('Invalid Transposition!!')
         return 0
 
 
 def unicyclic(n, index = 0):
-    sigma = Permutation([], size=(2**n)-1)  # permutação Identidade para n-1 bits
+    sigma = PermutacaoArray.identidade((2**n)-1)  # permutação Identidade para n-1 bits
     sigma = sigma + index
-    return Permutation(list(Permutation([sigma.list(2**n)])))
+    return PermutacaoArray.de_ciclo(sigma.array_form + [(2**n)-1], 2**n)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+import os
+import tempfile
+import hashlib
+from pathlib import Path
+import numpy as np
+
+from implementations.windowed_arithmetic.synthesis.otimizador import executa_sintese, le_circuito_tfc, Circuito
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - windows
+    fcntl = None
+
+"""
+Cache persistente (em disco) dos circuitos gerados por `executa_sintese`.
+
+Cada resultado é gravado no formato TFC em um arquivo cujo nome é o digest de (n, tabela verdade), de forma que
+processos diferentes (ou execuções diferentes) reaproveitam as sínteses já realizadas.
+"""
+
+TAMANHO_MAXIMO_PADRAO = 256 * 1024 * 1024
+# um despejo remove arquivos até o cache ocupar esta fração do tamanho máximo, de forma que as varreduras sejam raras
+FRACAO_APOS_DESPEJO = 0.8
+# incrementada sempre que a síntese passa a gerar circuitos diferentes, invalidando os resultados antigos
+VERSAO_SINTESE = 2
+INDIFERENTE = 2
+DIRETORIO_PADRAO = Path.home() / '.cache' / 'quantum-circuits' / 'sintese'
+
+
+def normaliza_tabela(tabela_saida, mascara=None):
+    """
+    Converte a tabela de saída para uma matriz de bits (uma linha por entrada), aceitando os mesmos formatos de
+    `executa_sintese` (lista de inteiros, lista de listas ou vetor/matriz numpy). As entradas indiferentes (None
+    ou marcadas em `mascara`) recebem o valor `INDIFERENTE`.
+    """
+    try:
+        tabela = np.asarray(tabela_saida, dtype=np.uint8)
+        indiferentes = None
+    except TypeError:
+        objetos = np.asarray(tabela_saida, dtype=object)
+        indiferentes = np.equal(objetos, None)
+        tabela = np.where(indiferentes, 0, objetos).astype(np.uint8)
+
+    tabela = tabela.reshape(len(tabela), -1)
+
+    if mascara is not None:
+        mascara = np.broadcast_to(np.asarray(mascara, dtype=bool).reshape(len(tabela), -1), tabela.shape)
+        indiferentes = mascara if indiferentes is None else indiferentes.reshape(tabela.shape) | mascara
+
+    if indiferentes is not None:
+        tabela = tabela.copy()
+        tabela[indiferentes.reshape(tabela.shape)] = INDIFERENTE
+
+    return tabela
+
+
+def digest_tabela(n, tabela_saida, mascara=None, compartilhar_termos=False):
+    """
+    Calcula o endereço (digest) de uma síntese a partir da quantidade de variáveis, da tabela verdade e do modo de
+    síntese.
+    """
+    tabela = normaliza_tabela(tabela_saida, mascara)
+    linhas, colunas = tabela.shape
+
+    h = hashlib.sha256()
+    h.update(f'v{VERSAO_SINTESE}:{n}:{linhas}:{colunas}:'.encode())
+    if compartilhar_termos:
+        h.update(b'compartilhado:')
+    h.update(np.ascontiguousarray(tabela).tobytes())
+
+    return h.hexdigest()
+
+
+class CacheSintese:
+    def __init__(self, diretorio=None, tamanho_maximo=TAMANHO_MAXIMO_PADRAO):
+        """
+            Cache em disco endereçado por conteúdo para os resultados de `executa_sintese`.
+
+            As escritas são atômicas (arquivo temporário + `os.replace`), de forma que leitores concorrentes nunca
+            observam um arquivo incompleto. O tamanho total é mantido no arquivo `.tamanho`, atualizado a cada
+            escrita, e quando ultrapassa `tamanho_maximo` bytes os arquivos usados há mais tempo são removidos (LRU
+            pela data de modificação, atualizada a cada acerto) até sobrar `FRACAO_APOS_DESPEJO` do máximo.
+        :param diretorio: Diretório onde os circuitos são gravados.
+        :param tamanho_maximo: Tamanho máximo, em bytes, ocupado pelo cache. `None` desabilita o limite.
+        """
+        if diretorio is None:
+            diretorio = DIRETORIO_PADRAO
+
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.tamanho_maximo = tamanho_maximo
+
+        self.acertos = 0
+        self.falhas = 0
+
+    def caminho(self, digest):
+        return self.diretorio / digest[:2] / f'{digest}.tfc'
+
+    def obtem(self, n, tabela_saida, mascara=None, compartilhar_termos=False):
+        """
+        Retorna o circuito armazenado para a tabela, ou None caso ainda não tenha sido sintetizado.
+        """
+        arquivo = self.caminho(digest_tabela(n, tabela_saida, mascara, compartilhar_termos))
+
+        try:
+            conteudo = arquivo.read_text()
+        except FileNotFoundError:
+            self.falhas += 1
+            return None
+
+        try:
+            os.utime(arquivo)
+        except FileNotFoundError:
+            # removido por outro processo logo após a leitura
+            pass
+
+        self.acertos += 1
+        return le_circuito_tfc(conteudo)
+
+    def armazena(self, n, tabela_saida, circuito: Circuito, mascara=None, compartilhar_termos=False):
+        """
+        Grava o circuito de forma atômica e aplica a política de despejo.
+        """
+        arquivo = self.caminho(digest_tabela(n, tabela_saida, mascara, compartilhar_termos))
+        arquivo.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            anterior = arquivo.stat().st_size
+        except FileNotFoundError:
+            anterior = 0
+
+        descritor, temporario = tempfile.mkstemp(dir=arquivo.parent, prefix='.tmp-', suffix='.tfc')
+        try:
+            with os.fdopen(descritor, 'w') as f:
+                f.write(str(circuito))
+                f.flush()
+                os.fsync(f.fileno())
+                tamanho = os.fstat(f.fileno()).st_size
+            os.replace(temporario, arquivo)
+        except BaseException:
+            try:
+                os.unlink(temporario)
+            except FileNotFoundError:
+                pass
+            raise
+
+        self.contabiliza(tamanho - anterior)
+
+    def contabiliza(self, variacao):
+        """
+        Soma a variação (em bytes) ao tamanho total guardado em `.tamanho` e despeja apenas quando o máximo é
+        ultrapassado, de forma que uma escrita comum não percorre o diretório. Sem o arquivo (ou com ele
+        corrompido) o tamanho é recalculado pela varredura.
+        """
+        if self.tamanho_maximo is None:
+            return
+
+        with self.__trava():
+            total = self.__le_total()
+            if total is None or total + variacao > self.tamanho_maximo:
+                total = self.__despeja()
+            else:
+                total += variacao
+            self.__grava_total(total)
+
+    def despeja(self):
+        """
+        Recalcula o tamanho do cache e, caso ultrapasse o máximo, remove os arquivos usados há mais tempo até
+        sobrar `FRACAO_APOS_DESPEJO` do tamanho máximo.
+        Um lock (quando disponível) evita que vários processos despejem ao mesmo tempo.
+        """
+        if self.tamanho_maximo is None:
+            return
+
+        with self.__trava():
+            self.__grava_total(self.__despeja())
+
+    def __despeja(self):
+        # deve ser chamado com o lock; retorna o tamanho total após o despejo
+        arquivos = list()
+        total = 0
+
+        for arquivo in self.diretorio.glob('*/*.tfc'):
+            try:
+                info = arquivo.stat()
+            except FileNotFoundError:
+                continue
+            arquivos.append((info.st_mtime, info.st_size, arquivo))
+            total += info.st_size
+
+        if total <= self.tamanho_maximo:
+            return total
+
+        limite = int(self.tamanho_maximo * FRACAO_APOS_DESPEJO)
+        arquivos.sort(key=lambda a: a[0])
+        for _, tamanho, arquivo in arquivos:
+            if total <= limite:
+                break
+            try:
+                arquivo.unlink()
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+        return total
+
+    def __le_total(self):
+        try:
+            return int((self.diretorio / '.tamanho').read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def __grava_total(self, total):
+        (self.diretorio / '.tamanho').write_text(str(max(total, 0)))
+
+    def limpa(self):
+        """
+        Remove todos os circuitos armazenados.
+        """
+        with self.__trava():
+            for arquivo in self.diretorio.glob('*/*.tfc'):
+                try:
+                    arquivo.unlink()
+                except FileNotFoundError:
+                    pass
+            self.__grava_total(0)
+
+    def estatisticas(self):
+        return {'acertos': self.acertos, 'falhas': self.falhas}
+
+    def __trava(self):
+        return _Trava(self.diretorio / '.lock')
+
+
+class _Trava:
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.descritor = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.descritor = os.open(self.arquivo, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.descritor, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if self.descritor is not None:
+            fcntl.flock(self.descritor, fcntl.LOCK_UN)
+            os.close(self.descritor)
+            self.descritor = None
+
+
+_cache_padrao = None
+
+
+def obtem_cache_padrao():
+    """
+    Retorna o cache usado por padrão. O diretório pode ser configurado pela variável de ambiente
+    `SINTESE_CACHE_DIR` e o tamanho máximo (em bytes) por `SINTESE_CACHE_TAMANHO`.
+    Definir `SINTESE_CACHE_DIR` como vazio desabilita o cache.
+    """
+    global _cache_padrao
+
+    if _cache_padrao is None:
+        diretorio = os.environ.get('SINTESE_CACHE_DIR', str(DIRETORIO_PADRAO))
+        if diretorio == '':
+            return None
+
+        tamanho = os.environ.get('SINTESE_CACHE_TAMANHO')
+        tamanho = TAMANHO_MAXIMO_PADRAO if tamanho is None else int(tamanho)
+
+        try:
+            _cache_padrao = CacheSintese(diretorio, tamanho)
+        except OSError:
+            # sem permissão de escrita, segue sem cache
+            return None
+
+    return _cache_padrao
+
+
+def define_cache_padrao(cache):
+    """
+    Substitui o cache padrão. Informe `None` para voltar a usar a configuração das variáveis de ambiente.
+    """
+    global _cache_padrao
+    _cache_padrao = cache
+
+
+def executa_sintese_com_cache(n, tabela_saida, prefixo='b', cache=None, mascara=None, compartilhar_termos=False):
+    """
+    Mesmo que `executa_sintese`, mas reaproveita resultados armazenados em disco.
+
+    :param cache: O cache a ser usado; por padrão `obtem_cache_padrao()`. Informe `False` para não usar cache.
+    :param mascara: Máscara de entradas indiferentes, veja `executa_sintese`.
+    :param compartilhar_termos: Sintetiza as saídas juntas, veja `executa_sintese`.
+    """
+    if cache is None:
+        cache = obtem_cache_padrao()
+
+    if not cache:
+        return executa_sintese(n=n, tabela_saida=tabela_saida, prefixo=prefixo, mascara=mascara,
+                               compartilhar_termos=compartilhar_termos)
+
+    circuito = cache.obtem(n, tabela_saida, mascara, compartilhar_termos)
+    if circuito is None:
+        circuito = executa_sintese(n=n, tabela_saida=tabela_saida, prefixo=prefixo, mascara=mascara,
+                                   compartilhar_termos=compartilhar_termos)
+        cache.armazena(n, tabela_saida, circuito, mascara, compartilhar_termos)
+
+    return circuito
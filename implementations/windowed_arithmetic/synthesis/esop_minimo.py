@@ -0,0 +1,269 @@
+import gzip
+import json
+from itertools import permutations, product
+from pathlib import Path
+import numpy as np
+
+"""
+Base de dados das expressões ESOP mínimas (exatas) das funções de até `VARIAVEIS_MAXIMAS` variáveis.
+
+A base é gerada uma única vez (`python -m implementations.windowed_arithmetic.synthesis.esop_minimo`) por uma busca
+em largura no espaço das tabelas verdade, onde cada passo soma (XOR) um dos 3^n cubos: a distância de uma função até a
+função nula é a quantidade mínima de termos da sua ESOP, e os empates são resolvidos pelo menor custo quântico das
+portas. Apenas um representante de cada classe NP (permutação e negação das entradas) é gravado; as expressões das
+demais funções da classe são obtidas permutando e negando os literais do representante. A negação da saída não é
+usada, pois somar o termo constante 1 muda a quantidade de termos.
+
+Os termos são pares de máscaras `(positivos, negativos)` onde o bit j é a variável j, sendo a variável 0 a mais
+significativa do índice da tabela verdade (a mesma convenção de `processa_termos`).
+"""
+
+VARIAVEIS_MAXIMAS = 4
+ARQUIVO_PADRAO = Path(__file__).with_name('esop_minimo.json.gz')
+
+
+def transformacoes(n):
+    """
+    Lista as transformações NP de n variáveis, pares `(permutacao, negacoes)`: a função transformada h de g é
+    h(x) = g(y), com y_j = x_permutacao[j] ⊕ (bit j de negacoes).
+    """
+    return [(sigma, nu) for sigma in permutations(range(n)) for nu in range(2 ** n)]
+
+
+def indices_transformacao(n, sigma, nu):
+    """
+    Índices y de cada entrada x da transformação, de forma que h = g[indices].
+    """
+    x = np.arange(2 ** n)
+    y = np.zeros(2 ** n, dtype=np.int64)
+
+    for j in range(n):
+        bit = ((x >> (n - 1 - sigma[j])) & 1) ^ ((nu >> j) & 1)
+        y |= bit << (n - 1 - j)
+
+    return y
+
+
+def empacota(bits):
+    """
+    Converte uma tabela verdade (vetor de 0 e 1) no inteiro cujo bit x é a entrada x, ou uma matriz (uma tabela por
+    linha) em um vetor de inteiros.
+    """
+    bits = np.asarray(bits, dtype=np.int64)
+    return bits @ (np.int64(1) << np.arange(bits.shape[-1], dtype=np.int64))
+
+
+def tabela_do_termo(positivos, negativos, n):
+    """
+    Tabela verdade (como inteiro) do termo: as entradas em que todos os literais valem 1.
+    """
+    tabela = 0
+    for x in range(2 ** n):
+        valores = sum(((x >> (n - 1 - j)) & 1) << j for j in range(n))
+        if valores & positivos == positivos and ~valores & negativos == negativos:
+            tabela |= 1 << x
+    return tabela
+
+
+def transforma_termos(termos, sigma, nu):
+    """
+    Leva os termos de g nos termos da função transformada (veja `transformacoes`): o literal da variável j passa para
+    a variável sigma[j], com o sinal invertido quando a variável j é negada.
+    """
+    transformados = list()
+
+    for positivos, negativos in termos:
+        novos_positivos = 0
+        novos_negativos = 0
+
+        for j, k in enumerate(sigma):
+            negado = (nu >> j) & 1
+            if (positivos >> j) & 1:
+                if negado:
+                    novos_negativos |= 1 << k
+                else:
+                    novos_positivos |= 1 << k
+            elif (negativos >> j) & 1:
+                if negado:
+                    novos_positivos |= 1 << k
+                else:
+                    novos_negativos |= 1 << k
+
+        transformados.append((novos_positivos, novos_negativos))
+
+    return transformados
+
+
+def gera_esop_minimo(n):
+    """
+        Calcula a ESOP mínima de todas as 2^(2^n) funções de n variáveis por uma busca em largura.
+
+    :param n: Quantidade de variáveis (até 4).
+    :return: Uma função que retorna a lista de termos de uma tabela verdade (inteiro).
+    """
+    from implementations.windowed_arithmetic.synthesis.otimizador import Toffoli
+
+    termos = [(p, m) for p, m in product(range(2 ** n), repeat=2) if p & m == 0]
+    tabelas = np.array([tabela_do_termo(p, m, n) for p, m in termos], dtype=np.int64)
+    custos = np.array([Toffoli.de_mascaras(n, p | m, p).calcula_custo_quantico() for p, m in termos], dtype=np.int64)
+
+    total = 2 ** (2 ** n)
+    infinito = np.iinfo(np.int64).max
+    distancia = np.full(total, -1, dtype=np.int64)
+    custo = np.full(total, infinito, dtype=np.int64)
+    anterior = np.full(total, -1, dtype=np.int64)
+
+    distancia[0] = 0
+    custo[0] = 0
+    fronteira = np.array([0], dtype=np.int64)
+    nivel = 0
+
+    while len(fronteira):
+        for indice, (tabela, custo_termo) in enumerate(zip(tabelas, custos)):
+            vizinhos = fronteira ^ tabela
+            candidatos = custo[fronteira] + custo_termo
+            melhores = (distancia[vizinhos] == -1) & (candidatos < custo[vizinhos])
+            custo[vizinhos[melhores]] = candidatos[melhores]
+            anterior[vizinhos[melhores]] = indice
+
+        nivel += 1
+        fronteira = np.flatnonzero((distancia == -1) & (custo < infinito))
+        distancia[fronteira] = nivel
+
+    def esop(f):
+        resultado = list()
+        while f:
+            indice = anterior[f]
+            resultado.append(termos[indice])
+            f ^= int(tabelas[indice])
+        return resultado
+
+    return esop
+
+
+def gera_base(variaveis_maximas=VARIAVEIS_MAXIMAS):
+    """
+    Gera a base: para cada quantidade de variáveis, um dicionário do representante (menor tabela verdade da classe NP)
+    para a sua ESOP mínima.
+    """
+    base = dict()
+
+    for n in range(1, variaveis_maximas + 1):
+        esop = gera_esop_minimo(n)
+        indices = np.array([indices_transformacao(n, sigma, nu) for sigma, nu in transformacoes(n)])
+        visitadas = np.zeros(2 ** (2 ** n), dtype=bool)
+
+        classes = dict()
+        for f in range(2 ** (2 ** n)):
+            if visitadas[f]:
+                continue
+
+            bits = (f >> np.arange(2 ** n)) & 1
+            visitadas[empacota(bits[indices])] = True
+            classes[f] = esop(f)
+
+        base[n] = classes
+
+    return base
+
+
+def salva_base(base, arquivo=ARQUIVO_PADRAO):
+    conteudo = {str(n): {str(f): [list(termo) for termo in termos] for f, termos in classes.items()}
+                for n, classes in base.items()}
+
+    with gzip.open(arquivo, 'wt') as f:
+        json.dump(conteudo, f, separators=(',', ':'), sort_keys=True)
+
+
+class BaseESOP:
+    def __init__(self, arquivo=ARQUIVO_PADRAO):
+        """
+            Base de ESOPs mínimas carregada do arquivo gerado por `gera_base`.
+
+            Na carga, cada uma das 2^(2^n) funções é associada à sua classe e à transformação que leva o
+            representante até ela, de forma que cada consulta custa O(1) mais a transformação dos termos.
+        :param arquivo: O arquivo (JSON compactado) com os representantes de cada classe.
+        """
+        with gzip.open(arquivo, 'rt') as f:
+            conteudo = json.load(f)
+
+        self.variaveis_maximas = 0
+        self.tabelas = dict()
+
+        for chave, classes in conteudo.items():
+            n = int(chave)
+            lista_transformacoes = transformacoes(n)
+            indices = np.array([indices_transformacao(n, sigma, nu) for sigma, nu in lista_transformacoes])
+
+            classe_de = np.full(2 ** (2 ** n), -1, dtype=np.int32)
+            transformacao_de = np.zeros(2 ** (2 ** n), dtype=np.int32)
+            representantes = list()
+
+            for representante, termos in classes.items():
+                bits = (int(representante) >> np.arange(2 ** n)) & 1
+                funcoes = empacota(bits[indices])
+
+                # a primeira transformação que leva o representante até cada função
+                funcoes, primeiras = np.unique(funcoes, return_index=True)
+                classe_de[funcoes] = len(representantes)
+                transformacao_de[funcoes] = primeiras
+                representantes.append([tuple(termo) for termo in termos])
+
+            if (classe_de < 0).any():
+                raise Exception(f'Base de ESOPs incompleta para {n} variáveis.')
+
+            self.tabelas[n] = (classe_de, transformacao_de, representantes, lista_transformacoes)
+            self.variaveis_maximas = max(self.variaveis_maximas, n)
+
+    def consulta(self, g, linhas):
+        """
+            Retorna a ESOP mínima da função `g`, com as variáveis nas linhas informadas.
+        :param g: A tabela verdade (vetor de 0 e 1) de uma função de até `variaveis_maximas` variáveis.
+        :param linhas: A linha de cada variável, da mais significativa para a menos significativa.
+        :return: A lista de termos `(positivos, negativos)`.
+        """
+        n = len(g).bit_length() - 1
+        classe_de, transformacao_de, representantes, lista_transformacoes = self.tabelas[n]
+
+        f = int(empacota(g))
+        sigma, nu = lista_transformacoes[transformacao_de[f]]
+        termos = transforma_termos(representantes[classe_de[f]], sigma, nu)
+
+        resultado = list()
+        for positivos, negativos in termos:
+            resultado.append((mapeia_linhas(positivos, linhas), mapeia_linhas(negativos, linhas)))
+
+        return resultado
+
+
+def mapeia_linhas(mascara, linhas):
+    """
+    Converte uma máscara de variáveis (bit j = variável j) em uma máscara de linhas.
+    """
+    resultado = 0
+    for j, linha in enumerate(linhas):
+        if (mascara >> j) & 1:
+            resultado |= 1 << linha
+    return resultado
+
+
+_base_padrao = None
+
+
+def obtem_base_padrao():
+    """
+    Retorna a base distribuída junto do módulo (carregada uma única vez), ou None caso o arquivo não exista.
+    """
+    global _base_padrao
+
+    if _base_padrao is None:
+        try:
+            _base_padrao = BaseESOP(ARQUIVO_PADRAO)
+        except FileNotFoundError:
+            return None
+
+    return _base_padrao
+
+
+if __name__ == '__main__':
+    salva_base(gera_base())
@@ -1,122 +1,175 @@
 from qiskit import QuantumCircuit, QuantumRegister
+from qiskit.circuit.library import MCXGate
 
-def porta(k, x, y, pi, limite):
+def porta(k, x, y, pi, inversa):
     """
-    Realiza uma troca na permutação baseada em uma "porta" e imprime a operação.
+    Realiza uma troca na permutação baseada em uma "porta" e retorna a porta aplicada.
+
+    A porta inverte o bit y de `x` quando todos os demais bits são iguais aos de `x`, ou seja, troca os valores
+    `x` e `x ^ 2^(y-1)` de posição na permutação. Com o vetor `inversa` (a posição de cada valor) a troca custa O(1).
 
     Args:
         k (int): Número de bits.
         x (int): Valor atual na permutação a ser trocado.
         y (int): Posição do bit (1-based) que define a porta.
         pi (list): A lista (vetor) da permutação.
-        limite (int): O deslocamento para limitar a busca inicial no array.
+        inversa (list): A permutação inversa, `inversa[pi[i]] == i`, atualizada junto de `pi`.
+
+    Returns:
+        porta (tuple[int, int, int]): a linha de alvo, a máscara das linhas de controle e a máscara de polaridade
+        (bit 1 = controle positivo), o bit b do valor é a linha b.
     """
     # Calcula o valor a ser trocado (aux) usando XOR para inverter o bit na posição y.
     # y-1 porque a indexação de bits é 0-based na programação, mas 1-based na lógica do problema.
     z = 1 << (y - 1)
     aux = x ^ z
 
-    # --- Imprime a representação da porta, como "T(1*0)" ---
-    # Constrói uma lista de caracteres para a representação binária
-    representacao_porta = []
-    for i in range(k - 1, -1, -1):
-        if i == y - 1:
-            representacao_porta.append('*')
-        elif (x & (1 << i)):
-            representacao_porta.append('1')
-        else:
-            representacao_porta.append('0')
-            
-    #print(f"T({''.join(representacao_porta)[::-1]})")
-
     # --- Realiza a troca na permutação ---
-    # Encontra o índice de 'aux' na parte "não resolvida" da lista e o substitui por 'x'.
-    # O slice pi[:-limite] corresponde à busca nos primeiros pow(2,k)-limite elementos.
-    # Nota: Em Python, é mais fácil usar o método index().
-    block_index = -1
-    try:
-        # Busca apenas na parte relevante da lista, que diminui a cada iteração do hipercubo
-        if limite > 0:
-            block_index = pi.index(aux, 0, len(pi) - limite)
-        else:
-            block_index = pi.index(aux)
-        pi[block_index] = x
-    except ValueError:
-        # Ocorre se o valor não for encontrado. O código C original não trata este erro.
-        # print(f"Aviso: valor {aux} não encontrado na sublista designada.")
-        return
-
-    # Encontra o índice de 'x' (que não seja o que acabamos de colocar) e o substitui por 'aux'.
-    # Isso completa a troca.
-    try:
-        for i in range(len(pi)):
-            if pi[i] == x and i != block_index:
-                pi[i] = aux
-                break
-    except ValueError:
-        pass # Ignora se não encontrar
-
-    return f"{''.join(representacao_porta)}"[::-1]
-
-def hipercubo(k, vet_s):
+    posicao_x = inversa[x]
+    posicao_aux = inversa[aux]
+
+    pi[posicao_x] = aux
+    pi[posicao_aux] = x
+    inversa[x] = posicao_aux
+    inversa[aux] = posicao_x
+
+    # todos os outros bits são controles, com o sinal dado pelos bits de x
+    mascara = ((1 << k) - 1) ^ z
+    return y - 1, mascara, x & mascara
+
+def hipercubo(k, vet_s, bidirecional=False):
     """
-    Processa a permutação para ordená-la, imprimindo as portas necessárias.
+    Processa a permutação para ordená-la, retornando as portas necessárias.
+
+    Na forma bidirecional, a cada passo o valor i é levado à posição i pelo lado mais barato: pela saída (trocando o
+    valor vet_s[i] por i, como na forma unidirecional) ou pela entrada (trocando a posição onde i está pela posição
+    i), o que pedir menos portas.
 
     Args:
         k (int): Número de bits.
-        vet_s (list): O vetor da permutação.
+        vet_s (list): O vetor da permutação (não é alterado).
+        bidirecional (bool): escolhe, a cada passo, o lado (entrada ou saída) que precisa de menos portas.
+
+    Returns:
+        portas (list[tuple[int, int, int]]): as portas `(alvo, mascara, polaridade)` na ordem do circuito.
     """
     n = 1 << k  # 2^k, a quantidade total de valores
-    limite = -1
-    cont = 0
+    vet_s = list(vet_s)
+    inversa = [0] * n
+    for posicao, valor in enumerate(vet_s):
+        inversa[valor] = posicao
+
+    portasEntrada = []
     listaPortas = []
+    todos = n - 1
 
     # Itera de N-1 para 0, tentando colocar cada valor i na sua posição correta vet_s[i]
     for i in range(n - 1, -1, -1):
-        limite += 1
-        x = i
-        
+        x = vet_s[i]
+
         # Se o valor na posição 'i' já não for o correto
-        if vet_s[i] != x:
-            # z contém os bits que precisam ser invertidos para transformar vet_s[i] em x
-            z = x ^ vet_s[i]
-            
-            # Para cada bit que precisa ser mudado, aplica uma porta
-            for j in range(k):
-                # Verifica se o j-ésimo bit está setado em z
-                if (z & (1 << j)) > 0:
-                    listaPortas.append(porta(k, vet_s[i], j + 1, vet_s, limite))
-                    cont += 1
-    
-    #print(f"\n{cont} iterações (portas)")
-
-    return listaPortas[::-1]
-
-def cria_portas_sintese_nova(n_bits, table):
+        if x != i:
+            # z contém os bits que precisam ser invertidos para transformar vet_s[i] em i
+            z = x ^ i
+
+            if bidirecional:
+                p = inversa[i]
+                zp = p ^ i
+
+                if zp.bit_count() < z.bit_count():
+                    # pela entrada: cada porta troca as posições p e p ^ bit, levando o valor i até a posição i
+                    while zp:
+                        bit = zp & -zp
+                        zp ^= bit
+                        aux = p ^ bit
+
+                        valor_aux = vet_s[aux]
+                        vet_s[aux] = i
+                        vet_s[p] = valor_aux
+                        inversa[i] = aux
+                        inversa[valor_aux] = p
+
+                        mascara = todos ^ bit
+                        portasEntrada.append((bit.bit_length() - 1, mascara, p & mascara))
+                        p = aux
+                    continue
+
+            # Para cada bit que precisa ser mudado (do menos significativo), aplica uma porta: o mesmo que
+            # `porta(k, x, j + 1, vet_s, inversa)`, repetido aqui por ser o laço mais interno
+            while z:
+                bit = z & -z
+                z ^= bit
+                aux = x ^ bit
+
+                posicao_aux = inversa[aux]
+                vet_s[i] = aux
+                vet_s[posicao_aux] = x
+                inversa[x] = posicao_aux
+                inversa[aux] = i
+
+                mascara = todos ^ bit
+                listaPortas.append((bit.bit_length() - 1, mascara, x & mascara))
+                x = aux
+
+    # as portas da entrada são aplicadas primeiro, na ordem em que foram encontradas
+    return portasEntrada + listaPortas[::-1]
+
+def cria_portas_sintese_nova(n_bits, table, bidirecional=False):
     saida = table
 
-    portas = hipercubo(n_bits, saida)
+    portas = hipercubo(n_bits, saida, bidirecional)
 
     return portas
 
-def cria_circuito_sintese_nova(n_bits, table, controlado=False):
-    portas = cria_portas_sintese_nova(n_bits, table)
-
-    q_reg = QuantumRegister(n_bits, "qreg")
-
-    qc = QuantumCircuit(q_reg)
-    
-    for porta in portas:
-        ctrl_state = ""
-        if porta:
-            for bit in range(len(porta)):
-
-                if porta[bit] == "*":
-                    targetidx = bit
+def cria_circuito_sintese_nova(n_bits, table, controlado=False, bidirecional=False):
+    """
+    Cria o circuito (como uma porta) que implementa a permutação `table` de `n_bits` bits.
 
-                else:
-                    ctrl_state = porta[bit] + ctrl_state
+    Args:
+        n_bits (int): Número de bits.
+        table (list): A permutação.
+        controlado (bool): adiciona um qubit de controle (o primeiro, como em `Gate.control()`) a todas as portas,
+            o que evita a síntese genérica de controle do Qiskit.
+        bidirecional (bool): usa a síntese bidirecional, veja `hipercubo`.
+
+    Returns:
+        gate (Gate): a porta com `n_bits` qubits (`n_bits + 1` quando controlada).
+    """
+    portas = cria_portas_sintese_nova(n_bits, table, bidirecional)
 
-            qc.mcx(control_qubits=q_reg[0:targetidx]+q_reg[targetidx+1:], target_qubit=q_reg[targetidx], ctrl_state=ctrl_state)
+    q_reg = QuantumRegister(n_bits, "qreg")
 
-    return qc.to_gate()
\ No newline at end of file
+    if controlado:
+        c_reg = QuantumRegister(1, "ctrl")
+        qc = QuantumCircuit(c_reg, q_reg)
+        extra = c_reg[:]
+    else:
+        qc = QuantumCircuit(q_reg)
+        extra = []
+
+    if n_bits == 1:
+        for targetidx, _, _ in portas:
+            if controlado:
+                qc.cx(c_reg[0], q_reg[targetidx])
+            else:
+                qc.x(q_reg[targetidx])
+        return qc.to_gate()
+
+    # os controles são o controle extra e todos os outros qubits em ordem, seguidos do alvo
+    qubits = [tuple(extra + q_reg[0:targetidx] + q_reg[targetidx+1:] + [q_reg[targetidx]]) for targetidx in range(n_bits)]
+    modelo = MCXGate(n_bits - 1 + len(extra))
+
+    for targetidx, mascara, polaridade in portas:
+        # o sinal do controle c fica no bit c do ctrl_state
+        abaixo = polaridade & ((1 << targetidx) - 1)
+        acima = polaridade >> (targetidx + 1)
+        ctrl_state = abaixo | (acima << targetidx)
+
+        if controlado:
+            ctrl_state = (ctrl_state << 1) | 1
+
+        mcx = modelo.copy()
+        mcx.ctrl_state = ctrl_state
+        qc.append(mcx, qubits[targetidx], copy=False)
+
+    return qc.to_gate()
@@ -0,0 +1,288 @@
+import time
+
+from implementations.windowed_arithmetic.synthesis.otimizador import Circuito, Toffoli
+
+"""
+Otimização local (peephole) dos circuitos de Toffoli gerados pela síntese.
+
+As regras aplicadas são identidades exatas, de forma que o circuito otimizado implementa a mesma permutação:
+    - duas portas iguais separadas apenas por portas que comutam com elas se cancelam;
+    - duas portas com o mesmo alvo que diferem em uma única linha (`Toffoli.eh_adjacente`) se unem em uma só;
+    - uma porta pode passar por vizinhas com que comuta, expondo novos cancelamentos e uniões;
+    - regra de movimentação da porta NOT: ao passar por uma porta controlada pela sua linha, o sinal desse controle
+      é invertido, de forma que duas NOT na mesma linha podem ser levadas uma até a outra e canceladas;
+    - templates de passagem (veja `porta_de_passagem`): quando o alvo de B é controle de A, A.B = B.A.E, de onde
+      vêm as identidades A.B.A = B.E e B.A.B = A.E, que trocam três portas por duas.
+
+Rahman, Md Zamilur, and Jacqueline E. Rice. "Templates for positive and negative control Toffoli networks."
+International Conference on Reversible Computation. Springer, Cham, 2014.
+"""
+
+JANELA_PADRAO = 64
+TEMPO_LIMITE_PADRAO = 1.0
+
+
+def comutam(a: Toffoli, b: Toffoli):
+    """
+    Verifica se as duas portas comutam: quando têm o mesmo alvo, quando nenhuma controla o alvo da outra ou quando
+    nunca são ativadas juntas (possuem um controle em comum com sinais opostos).
+    """
+    if a.alvo == b.alvo:
+        return True
+
+    if not ((b.mascara >> a.alvo) & 1 or (a.mascara >> b.alvo) & 1):
+        return True
+
+    return bool(a.mascara & b.mascara & (a.polaridade ^ b.polaridade))
+
+
+def une_portas(a: Toffoli, b: Toffoli):
+    """
+    Une duas portas adjacentes (veja `Toffoli.eh_adjacente`) em uma única porta equivalente a aplicar as duas.
+    """
+    ausentes = a.mascara ^ b.mascara
+    sinais = a.mascara & b.mascara & (a.polaridade ^ b.polaridade)
+
+    if sinais:
+        # C.x + C.x' = C
+        return Toffoli.de_mascaras(a.alvo, a.mascara & ~sinais, a.polaridade & ~sinais)
+
+    # C + C.x = C.x'
+    maior = a if a.mascara & ausentes else b
+    return Toffoli.de_mascaras(maior.alvo, maior.mascara, maior.polaridade ^ ausentes)
+
+
+def propaga_not(portas, i, janela=JANELA_PADRAO):
+    """
+    Leva a porta NOT na posição `i` até a próxima NOT na mesma linha, invertendo o sinal dos controles nessa linha
+    das portas no caminho, e cancela as duas. A troca só é feita quando não aumenta o custo quântico.
+
+    :param portas: A lista de portas, alterada no próprio lugar (as portas removidas viram None).
+    :return: True caso as portas tenham sido canceladas.
+    """
+    porta = portas[i]
+    linha = 1 << porta.alvo
+
+    trocas = list()
+    acrescimo = 0
+    vistas = 0
+
+    for j in range(i + 1, len(portas)):
+        outra = portas[j]
+        if outra is None:
+            continue
+
+        if outra.mascara == 0 and outra.alvo == porta.alvo:
+            # as duas NOT removidas custam 2
+            if acrescimo > 2:
+                return False
+
+            for k, nova in trocas:
+                portas[k] = nova
+            portas[i] = portas[j] = None
+            return True
+
+        if outra.mascara & linha:
+            nova = Toffoli.de_mascaras(outra.alvo, outra.mascara, outra.polaridade ^ linha)
+            acrescimo += nova.calcula_custo_quantico() - outra.calcula_custo_quantico()
+            trocas.append((j, nova))
+
+        vistas += 1
+        if vistas >= janela:
+            return False
+
+    return False
+
+
+def porta_de_passagem(a: Toffoli, b: Toffoli):
+    """
+        Calcula a porta E gerada ao trocar a ordem de duas portas, isto é, tal que A.B = B.A.E (ordem de aplicação).
+        Vale quando uma das portas (P) é controlada pelo alvo da outra (Q) e Q não é controlada pelo alvo de P: E tem
+        o alvo de P e os controles de P, sem o alvo de Q, unidos aos controles de Q. E comuta com A e com B, o que
+        leva aos templates A.B.A = B.E e B.A.B = A.E.
+    :return: A porta E, ou None caso as portas não estejam nessa situação ou comutem.
+    """
+    if (a.mascara >> b.alvo) & 1:
+        p, q = a, b
+    else:
+        p, q = b, a
+
+    linha = 1 << q.alvo
+    if not p.mascara & linha or (q.mascara >> p.alvo) & 1:
+        return None
+
+    restantes = p.mascara & ~linha
+    if restantes & q.mascara & (p.polaridade ^ q.polaridade):
+        # nunca são ativadas juntas, as portas comutam
+        return None
+
+    return Toffoli.de_mascaras(p.alvo, restantes | q.mascara, (p.polaridade & ~linha) | q.polaridade)
+
+
+def aplica_template(portas, i, janela=JANELA_PADRAO):
+    """
+    Procura, a partir da porta na posição `i` (X), um trecho X ... M ... X em que as portas entre X e M e entre M e
+    a segunda X comutam com X, e o substitui por M.E (veja `porta_de_passagem`) quando o custo quântico diminui.
+
+    :param portas: A lista de portas, alterada no próprio lugar (as portas removidas viram None e a posição de M
+                   passa a guardar a tupla (M, E)).
+    :return: True caso o template tenha sido aplicado.
+    """
+    porta = portas[i]
+    meio = None
+    vistas = 0
+
+    for j in range(i + 1, len(portas)):
+        outra = portas[j]
+        if outra is None:
+            continue
+
+        if not isinstance(outra, Toffoli):
+            # trecho já substituído nesta passada
+            return False
+
+        if meio is None:
+            if not comutam(porta, outra):
+                gerada = porta_de_passagem(porta, outra)
+                if gerada is None:
+                    return False
+                meio = j
+        elif outra == porta:
+            # X.M.X custa 2X + M e M.E custa M + E
+            if gerada.calcula_custo_quantico() >= 2 * porta.calcula_custo_quantico():
+                return False
+
+            portas[meio] = (portas[meio], gerada)
+            portas[i] = portas[j] = None
+            return True
+        elif not comutam(porta, outra):
+            return False
+
+        vistas += 1
+        if vistas >= janela:
+            return False
+
+    return False
+
+
+def passada_templates(portas, janela=JANELA_PADRAO, prazo=None):
+    """
+    Percorre o circuito uma vez aplicando os templates de passagem (veja `aplica_template`).
+
+    :param portas: A lista de portas do circuito.
+    :param janela: Quantidade máxima de portas pelas quais uma porta é movida.
+    :param prazo: Instante (`time.monotonic`) a partir do qual a passada é interrompida.
+    :return: A nova lista de portas e se algum template foi aplicado.
+    """
+    portas = list(portas)
+    alterou = False
+
+    for i in range(len(portas)):
+        if prazo is not None and i % 256 == 0 and time.monotonic() > prazo:
+            break
+
+        if isinstance(portas[i], Toffoli) and aplica_template(portas, i, janela):
+            alterou = True
+
+    novas = list()
+    for porta in portas:
+        if isinstance(porta, tuple):
+            novas.extend(porta)
+        elif porta is not None:
+            novas.append(porta)
+
+    return novas, alterou
+
+
+def passada(portas, janela=JANELA_PADRAO, prazo=None):
+    """
+    Percorre o circuito uma vez aplicando as regras de cancelamento, união e movimentação da NOT.
+
+    :param portas: A lista de portas do circuito.
+    :param janela: Quantidade máxima de portas pelas quais uma porta é movida.
+    :param prazo: Instante (`time.monotonic`) a partir do qual a passada é interrompida.
+    :return: A nova lista de portas e se alguma regra foi aplicada.
+    """
+    portas = list(portas)
+    alterou = False
+
+    for i in range(len(portas)):
+        if prazo is not None and i % 256 == 0 and time.monotonic() > prazo:
+            break
+
+        porta = portas[i]
+        if porta is None:
+            continue
+
+        if porta.mascara == 0 and propaga_not(portas, i, janela):
+            alterou = True
+            continue
+
+        vistas = 0
+        for j in range(i + 1, len(portas)):
+            outra = portas[j]
+            if outra is None:
+                continue
+
+            if porta == outra:
+                portas[i] = portas[j] = None
+                alterou = True
+                break
+
+            if porta.eh_adjacente(outra):
+                unida = une_portas(porta, outra)
+                if unida.calcula_custo_quantico() <= porta.calcula_custo_quantico() + outra.calcula_custo_quantico():
+                    portas[i] = None
+                    portas[j] = unida
+                    alterou = True
+                    break
+
+            if not comutam(porta, outra):
+                break
+
+            vistas += 1
+            if vistas >= janela:
+                break
+
+    return [porta for porta in portas if porta is not None], alterou
+
+
+def otimiza_circuito(circuito: Circuito, tempo_limite=TEMPO_LIMITE_PADRAO, janela=JANELA_PADRAO):
+    """
+        Aplica as passadas de otimização local (regras e templates) até que nenhuma regra possa ser aplicada ou o tempo acabe.
+        O circuito original não é alterado.
+    :param circuito: O circuito a ser otimizado.
+    :param tempo_limite: Tempo máximo, em segundos, gasto na otimização. `None` não limita o tempo.
+    :param janela: Quantidade máxima de portas pelas quais uma porta é movida.
+    :return: O circuito otimizado e um relatório com os custos (gc e qc) antes e depois.
+    """
+    inicio = time.monotonic()
+    prazo = None if tempo_limite is None else inicio + tempo_limite
+
+    portas = circuito.portas
+    passadas = 0
+    concluido = False
+
+    while prazo is None or time.monotonic() < prazo:
+        portas, alterou = passada(portas, janela, prazo)
+        portas, aplicou = passada_templates(portas, janela, prazo)
+        alterou = alterou or aplicou
+        passadas += 1
+
+        if not alterou:
+            concluido = True
+            break
+
+    otimizado = Circuito(list(portas), circuito.tamanho_circuito, circuito.bits_extras)
+
+    relatorio = {
+        'gc_inicial': circuito.gc,
+        'qc_inicial': circuito.qc,
+        'gc_final': otimizado.gc,
+        'qc_final': otimizado.qc,
+        'passadas': passadas,
+        'concluido': concluido,
+        'tempo': time.monotonic() - inicio,
+    }
+
+    return otimizado, relatorio
@@ -1,6 +1,5 @@
 from typing import List
 import re
-import copy
 import time
 from pathlib import Path
 import numpy as np
@@ -8,13 +7,23 @@ from itertools import product
 from math import log2
 from enum import Enum
 
+from implementations.windowed_arithmetic.synthesis.esop_minimo import obtem_base_padrao
+
 """
 Arquivo para realizacao da sintese do circuito feito pelo Raphael Bernadino
 Implementacao original: https://github.com/raphaelbernardino/rblk
 """
 
 
+class TempoEsgotado(Exception):
+    """
+    A síntese foi interrompida porque o prazo (`time.monotonic`) informado a `executa_sintese` acabou.
+    """
+
+
 class Alvo:
+    __slots__ = ('linha_original', 'linha')
+
     def __init__(self, linha, mapa=None):
         self.linha_original = int(linha)
 
@@ -59,7 +68,7 @@ class Alvo:
         return self.linha < other.linha
 
     def __hash__(self):
-        return id(self.linha) * hash(self.linha + 1)
+        return hash(self.linha)
 
 
 
@@ -95,6 +104,8 @@ class States(Enum):
     
 
 class Controle:
+    __slots__ = ('linha_original', 'linha', 'sinal')
+
     def __init__(self, linha, sinal, mapa=None):
         self.linha_original = int(linha)
 
@@ -173,146 +184,130 @@ class Controle:
         return self.linha < other.linha
 
     def __hash__(self):
-        return id(self.sinal) * hash(self.linha + 1)
+        return hash((self.linha, self.sinal))
 
 
 class Toffoli:
-    def __init__(self, alvos: List[Alvo], controles: List[Controle], mapa=None):
-        self.tamanho_bits = 1 + len(controles)
+    """
+        Porta Toffoli generalizada com controles positivos e negativos, representada por três inteiros:
+        a linha de alvo, a máscara das linhas de controle e a máscara de polaridade (bit 1 = controle positivo).
 
-        self.mapeamento = mapa
-        if mapa is None:
-            # k = [(i, i) for i in range(self.tamanho_bits)]
-
-            # busca a maior linha de alvo
-            maior_linha_alvo = 0
-            if isinstance(alvos, list):
-                maior_linha_alvo = alvos[0].linha
-            elif isinstance(alvos, Alvo):
-                maior_linha_alvo = alvos.linha
-            else:
-                raise Exception(f'Alvo não possui um tipo identificavel. (alvos: {type(alvos)})')
+        As portas são valores imutáveis: podem ser compartilhadas entre circuitos sem cópia, e as operações que as
+        modificam retornam uma nova porta.
+    """
+    __slots__ = ('alvo', 'mascara', 'polaridade')
 
-            # busca a maior linha de controle
-            maior_linha_controle = 0
-            if len(controles) > 0:
-                maior_linha_controle = max([ctrl.linha for ctrl in controles])
+    def __init__(self, alvos: List[Alvo], controles: List[Controle], mapa=None):
+        if isinstance(alvos, list):
+            if len(alvos) != 1:
+                raise Exception('Alvos inválidos! É necessário apenas um alvo.')
+            alvos = alvos[0]
 
-            # identifica a maior linha entre controles e alvos
-            maior_linha = max(maior_linha_alvo, maior_linha_controle)
-            # print(f'Maior linha:: {maior_linha_alvo} :: {maior_linha_controle} ==> {maior_linha}')
+        if isinstance(alvos, Alvo):
+            alvo = alvos.linha
+        elif isinstance(alvos, int):
+            alvo = alvos
+        else:
+            raise Exception(f'Alvo não possui um tipo identificavel. (alvos: {type(alvos)})')
 
-            # gera o mapeamento a partir da maior linha
-            k = [(i, i) for i in range(maior_linha + 1)]
-            self.mapeamento = dict(k)
+        mascara = 0
+        polaridade = 0
+        for ctrl in controles:
+            linha = ctrl.linha if mapa is None else mapa.get(ctrl.linha, ctrl.linha)
+            mascara |= 1 << linha
+            if ctrl.sinal:
+                polaridade |= 1 << linha
 
-        self.alvos = self.__inicializa_alvos(alvos)
-        self.controles = self.__inicializa_controles(controles)
+        if mapa is not None:
+            alvo = mapa.get(alvo, alvo)
 
-    # def mapeia(self, mapa):
-    #     # realiza mapeamento do alvo
-    #     self.alvos.mapeia(mapa)
-    #
-    #     # realiza mapeamento dos controles
-    #     for controle in self.controles:
-    #         controle.mapeia(mapa)
+        if alvo < 0:
+            raise Exception('Alvo inválido! Linha negativa.')
 
-    def modifica_linhas(self, mapeamento: dict):
-        """
-        Modifica a linha atual através de mapeamento.
+        object.__setattr__(self, 'alvo', alvo)
+        object.__setattr__(self, 'mascara', mascara)
+        object.__setattr__(self, 'polaridade', polaridade)
 
-        @param mapeamento: Um dicionário contendo o mapeamento a ser realizado.
+    @classmethod
+    def de_mascaras(cls, alvo: int, mascara: int, polaridade: int):
         """
-        linha_alvo = self.alvos.linha
-        nova_linha_alvo = mapeamento[linha_alvo]
+        Cria a porta diretamente a partir da linha de alvo e das máscaras de controle e de polaridade.
+        """
+        porta = object.__new__(cls)
+        object.__setattr__(porta, 'alvo', alvo)
+        object.__setattr__(porta, 'mascara', mascara)
+        object.__setattr__(porta, 'polaridade', polaridade & mascara)
+        return porta
 
-        diferenca_linha = linha_alvo - nova_linha_alvo
-        self.alvos.modifica_linha(diferenca_linha)
+    def __setattr__(self, nome, valor):
+        raise AttributeError('Toffoli é imutável.')
 
-        for ctrl in self.controles:
-            linha_ctrl = ctrl.linha
-            nova_linha_ctrl = mapeamento[linha_ctrl]
+    def __reduce__(self):
+        return Toffoli.de_mascaras, (self.alvo, self.mascara, self.polaridade)
 
-            diferenca_linha = linha_ctrl - nova_linha_ctrl
-            ctrl.modifica_linha(diferenca_linha)
+    @property
+    def alvos(self):
+        return Alvo(self.alvo)
 
-    def __inicializa_alvos(self, alvos):
-        alvo = list()
+    @property
+    def controles(self):
+        return [Controle(linha, bool((self.polaridade >> linha) & 1)) for linha in linhas_da_mascara(self.mascara)]
 
-        if isinstance(alvos, Alvo):
-            um_alvo = copy.deepcopy(alvos)
-            um_alvo.linha_original = alvos.linha
-            um_alvo.linha = self.mapeamento[alvos.linha]
-            alvo.append(um_alvo)
+    @property
+    def tamanho_bits(self):
+        return 1 + self.mascara.bit_count()
 
-        if isinstance(alvos, list):
-            # alvo = [copy.deepcopy(a) for a in alvos]
-            for a in alvos:
-                um_alvo = copy.deepcopy(a)
-                um_alvo.linha_original = a.linha
-                # print(f'Mapeamento: {self.mapeamento}')
-                # print(f'Alvos: {alvos}')
-                # print(f'Linha: {a.linha}')
-                # print(f'um_alvo: {um_alvo} :: {um_alvo.linha} :: {um_alvo.linha_original}')
-                um_alvo.linha = self.mapeamento[a.linha]
-                alvo.append(um_alvo)
-
-        if isinstance(alvos, int):
-            um_alvo = Alvo(alvos, self.mapeamento)
-            alvo.append(um_alvo)
-
-        if len(alvo) != 1:
-            raise Exception('Alvos inválidos! É necessário apenas um alvo.')
-
-        return alvo[0]
-
-    def __inicializa_controles(self, ctrls: List[Controle]):
-        controles = list()
-
-        for ctrl in ctrls:
-            um_controle = copy.deepcopy(ctrl)
-            # print(f'Mapeamento: {self.mapeamento}')
-            # print(f'Linha Original: {ctrl.linha} :: {um_controle.linha_original} :: {um_controle.linha}')
-            um_controle.linha_original = ctrl.linha
-            um_controle.linha = self.mapeamento[ctrl.linha]
-            controles.append(um_controle)
-
-        return controles
+    def modifica_linhas(self, mapeamento: dict):
+        """
+        Retorna a porta com as linhas trocadas através do mapeamento (linhas ausentes são mantidas).
 
-    def remapeia(self, mapa):
-        self.alvos.remapeia(mapa)
+        @param mapeamento: Um dicionário contendo o mapeamento a ser realizado.
+        """
+        mascara = 0
+        polaridade = 0
+        for linha in linhas_da_mascara(self.mascara):
+            nova_linha = mapeamento.get(linha, linha)
+            mascara |= 1 << nova_linha
+            if (self.polaridade >> linha) & 1:
+                polaridade |= 1 << nova_linha
+
+        return Toffoli.de_mascaras(mapeamento.get(self.alvo, self.alvo), mascara, polaridade)
 
-        for ctrl in self.controles:
-            ctrl.remapeia(mapa)
+    def remapeia(self, mapa):
+        return self.modifica_linhas(dict(enumerate(mapa)) if isinstance(mapa, (list, tuple)) else mapa)
 
     def adiciona_controles(self, controles):
-        # linhas_usadas = self.obtem_linhas_de_controle_usadas()
-        linhas_usadas = self.obtem_linhas_usadas()
-        controles_antigos = copy.deepcopy(self.controles)
+        mascara = self.mascara
+        polaridade = self.polaridade
 
         for ctrl in controles:
-            if ctrl.linha in linhas_usadas:
-                self.controles = controles_antigos
-                raise Exception('Linha {ctrl.linha} já está ocupada')
+            if ctrl.linha == self.alvo or (mascara >> ctrl.linha) & 1:
+                raise Exception(f'Linha {ctrl.linha} já está ocupada')
 
-            um_controle = copy.deepcopy(ctrl)
-            self.controles.append(um_controle)
-            self.tamanho_bits = len(self.obtem_linhas_usadas())
+            mascara |= 1 << ctrl.linha
+            if ctrl.sinal:
+                polaridade |= 1 << ctrl.linha
+
+        return Toffoli.de_mascaras(self.alvo, mascara, polaridade)
 
     def remove_controle(self, ctrl):
-        if ctrl in self.controles:
-            self.controles.remove(ctrl)
-            self.tamanho_bits = len(self.obtem_linhas_usadas())
+        bit = 1 << ctrl.linha
+        if not self.mascara & bit or bool(self.polaridade & bit) != ctrl.sinal:
+            return self
+
+        return Toffoli.de_mascaras(self.alvo, self.mascara & ~bit, self.polaridade & ~bit)
 
     def remove_controles(self, controles):
+        porta = self
         for ctrl in controles:
-            self.remove_controle(ctrl)
+            porta = porta.remove_controle(ctrl)
+        return porta
 
     def obtem_alvos(self):
         return [self.alvos]
 
     def obtem_copia(self):
-        return copy.deepcopy(self)
+        return self
 
     def calcula_custo_cnot(self):
         """
@@ -322,7 +317,7 @@ class Toffoli:
 
         @return: O custo de CNOTs da porta.
         """
-        n = len(self.controles)
+        n = self.mascara.bit_count()
         return 2 * n ** 2 - 2 * n + 1
 
     def calcula_custo_quantico(self):
@@ -387,41 +382,21 @@ class Toffoli:
         return custo_total
 
     def todos_controles_negativos(self):
-        for ctrl in self.controles:
-            # se o sinal é positivo, retorna False
-            if ctrl.eh_sinal_positivo():
-                return False
-
-        # se todos os sinais são negativos, retorna True
-        return True
+        return self.polaridade == 0
 
     def eh_porta_not(self):
-        return len(self.controles) == 0
+        return self.mascara == 0
 
     def eh_adjacente(self, other):
-        if self.obtem_alvos() != other.obtem_alvos():
-            return False
-
-        diff = self.diferenca_entre_controles(other)
-        diffs = len(diff)
-
-        # pode diferir apenas em uma linha; se não houver ctrls diff, não é
-        if diffs == 0:
+        if self.alvo != other.alvo:
             return False
 
-        # se  houver apenas um controle diff, é adjacente
-        if diffs == 1:
-            return True
-
-        # se houver exatamente dois controles, verifique as linhas
-        if diffs == 2:
-            gc = diff[0]
-            hc = diff[1]
-
-            return gc.linha == hc.linha
+        # controles presentes em apenas uma das portas e controles com sinais diferentes
+        ausentes = self.mascara ^ other.mascara
+        sinais = self.mascara & other.mascara & (self.polaridade ^ other.polaridade)
 
-        # se houver mais de 2 ctrls diff. não pode ser adjacente
-        return False
+        # pode diferir apenas em uma linha: um controle a mais ou um controle com o sinal invertido
+        return (ausentes | sinais).bit_count() == 1
 
     def diferenca_entre_controles(self, other):
         s1 = set(self.controles)
@@ -430,98 +405,79 @@ class Toffoli:
         return sorted(diff)
 
     def obtem_linhas_de_alvo_usadas(self):
-        linhas_usadas = set()
-        linhas_usadas.add(self.alvos.linha)
-        return linhas_usadas
+        return {self.alvo}
 
     def obtem_linhas_de_controle_usadas(self):
-        linhas_usadas = set()
-
-        for ctrl in self.controles:
-            linha = ctrl.linha
-            linhas_usadas.add(linha)
-
-        return linhas_usadas
+        return set(linhas_da_mascara(self.mascara))
 
     def obtem_linhas_usadas(self):
-        linhas_de_alvo = self.obtem_linhas_de_alvo_usadas()
-        linhas_de_controle = self.obtem_linhas_de_controle_usadas()
-
-        linhas_usadas = linhas_de_alvo.union(linhas_de_controle)
-
-        return linhas_usadas
+        return self.obtem_linhas_de_controle_usadas() | {self.alvo}
 
     def inverte_controle_nas_linhas(self, linhas):
+        inverter = 0
         for linha in linhas:
-            for ctrl in self.controles:
-                if linha == ctrl.linha:
-                    ctrl.inverte_sinal()
+            inverter |= 1 << linha
+
+        return Toffoli.de_mascaras(self.alvo, self.mascara, self.polaridade ^ (inverter & self.mascara))
 
     def roda_porta_permutacao(self, elementos):
         for i in range(len(elementos)):
             elem = elementos[i]
-            # print('ELEM_ANTES -->', elem)
 
             if self.__deve_aplicar(elem):
                 elementos[i] = self.__aplica(elem)
 
-    def roda_porta_tabela_verdade(self, tabela):
-        # print('T', tabela)
+    def aplica_estados(self, estados):
+        """
+        Aplica a porta (no próprio vetor) a um vetor de estados da base, onde o bit `i` de cada inteiro é o valor
+        da linha `i`. A porta é aplicada de uma só vez como um XOR mascarado sobre todo o vetor.
+        """
+        if self.mascara == 0:
+            estados ^= 1 << self.alvo
+            return
 
-        for linha_tabela in tabela:
-            alvo = self.alvos
+        aplicar = (estados & self.mascara) == self.polaridade
+        estados ^= aplicar.astype(estados.dtype) << self.alvo
 
-            # print('L1', linha_tabela)
+    def roda_porta_tabela_verdade(self, tabela):
+        if isinstance(tabela, np.ndarray):
+            aplicar = np.ones(len(tabela), dtype=bool)
+            for linha in linhas_da_mascara(self.mascara):
+                aplicar &= tabela[:, linha] == ((self.polaridade >> linha) & 1)
+            tabela[aplicar, self.alvo] ^= 1
+            return
 
+        for linha_tabela in tabela:
             if self.__deve_aplicar(linha_tabela):
-                # print('aplicou')
-                linha_tabela[alvo.linha] = int(not linha_tabela[alvo.linha])
-                # print('L2', linha_tabela)
+                linha_tabela[self.alvo] = int(not linha_tabela[self.alvo])
 
     def __deve_aplicar(self, elementos):
-        for ctrl in self.controles:
-            linha = ctrl.linha
-            linha_mapeada = self.mapeamento[linha]
-            valor = int(elementos[linha_mapeada])
-
-            if ctrl.eh_sinal_positivo() and valor == 0:
-                return False
-
-            if ctrl.eh_sinal_negativo() and valor == 1:
+        for linha in linhas_da_mascara(self.mascara):
+            if int(elementos[linha]) != (self.polaridade >> linha) & 1:
                 return False
 
         return True
 
     def __aplica(self, e):
         el = list(e)
-        # print('\t\tVetor Elementos', el)
-
-        linha_alvo = self.alvos.linha
-        # print('\t\tLinha Alvo', linha_alvo)
 
-        linha_alvo_mapeada = self.mapeamento[linha_alvo]
-        # print('\t\tMapeamento', self.mapeamento)
-        # print('\t\tLinha Alvo Mapeada', linha_alvo_mapeada)
-
-        if el[linha_alvo_mapeada] == '0':
-            el[linha_alvo_mapeada] = '1'
-        elif el[linha_alvo_mapeada] == '1':
-            el[linha_alvo_mapeada] = '0'
+        if el[self.alvo] == '0':
+            el[self.alvo] = '1'
+        elif el[self.alvo] == '1':
+            el[self.alvo] = '0'
         else:
             raise Exception('Algum erro ocorreu!')
 
-        resultado = ''.join(el)
-        # print('ELEM_DEPOIS-->', resultado)
-
-        return resultado
+        return ''.join(el)
 
     def __repr__(self):
         s = f'T{self.tamanho_bits} '
 
-        for ctrl in sorted(self.controles):
-            s += f'{ctrl},'
+        for linha in linhas_da_mascara(self.mascara):
+            sinal = '' if (self.polaridade >> linha) & 1 else "'"
+            s += f'b{linha}{sinal},'
 
-        s += f'{self.alvos}'
+        s += f'b{self.alvo}'
 
         return s
 
@@ -529,19 +485,10 @@ class Toffoli:
         if not isinstance(other, self.__class__):
             return False
 
-        if self.obtem_alvos() != other.obtem_alvos():
-            return False
-
-        if len(self.controles) != len(other.controles):
-            return False
-
-        if self.controles != other.controles:
-            return False
-
-        return True
+        return self.alvo == other.alvo and self.mascara == other.mascara and self.polaridade == other.polaridade
 
     def __hash__(self):
-        return id(self.alvos) * hash(self.controles) * self.tamanho_bits
+        return hash((self.alvo, self.mascara, self.polaridade))
 
     def __len__(self):
         return self.tamanho_bits
@@ -607,7 +554,41 @@ def inverte_elementos(elementos):
         elementos[i] = elementos[i][::-1]
 
 
+def tipo_estados(qtd_linhas):
+    """
+    Tipo do vetor de estados para um circuito com `qtd_linhas` linhas: int64 enquanto couber, senão inteiros Python.
+    """
+    return np.int64 if qtd_linhas <= 63 else object
+
+
+def gera_estados_da_base(n, ancillas=0):
+    """
+    Gera os 2^n estados da base (ancillas em 0) como inteiros, na ordem da tabela verdade: a linha 0 é o bit mais
+    significativo do índice da entrada.
+    """
+    indices = np.arange(2 ** n, dtype=np.int64)
+    estados = np.zeros(2 ** n, dtype=tipo_estados(n + ancillas))
+
+    for linha in range(n):
+        estados |= ((indices >> (n - linha - 1)) & 1).astype(estados.dtype) << linha
+
+    return estados
+
+
+def estados_para_tabela(estados, qtd_linhas):
+    """
+    Converte um vetor de estados em uma matriz de bits (uma coluna por linha do circuito).
+    """
+    tabela = np.empty((len(estados), qtd_linhas), dtype=np.uint8)
+    for linha in range(qtd_linhas):
+        tabela[:, linha] = (estados >> linha) & 1
+
+    return tabela
+
+
 class Circuito:
+    __slots__ = ('bits_extras', 'tamanho_circuito', 'portas', 'mapeamento', 'gc', 'qc')
+
     def __init__(self, portas=None, qtd_vars=0, ancillas=0, mapa=None):
         """
             Recebe uma lista de portas e quantidade de variaveis.
@@ -647,14 +628,8 @@ class Circuito:
             info = list(info)
 
         if isinstance(info, list):
-            portas = list()
-
-            for p in info:
-                ptemp = copy.deepcopy(p)
-                ptemp.mapeamento = self.mapeamento
-                portas.append(ptemp)
-
-            return portas
+            # as portas são imutáveis, então podem ser compartilhadas sem cópia
+            return list(info)
 
         raise Exception('Circuito:: Operação não suportada!')
 
@@ -665,10 +640,6 @@ class Circuito:
     def obtem_mapeamentos(self):
         mapa = f'Mapeamento do Circuito: {self.mapeamento}'
 
-        mapa += f'\nMapeamento das portas:'
-        for porta in self.portas:
-            mapa += f'\n\t{porta} ==> {porta.mapeamento}'
-
         return mapa
 
     def obtem_quantidade_de_bits(self):
@@ -686,7 +657,7 @@ class Circuito:
         self.qc = self.custo_quantico()
 
     def obtem_copia(self):
-        return copy.deepcopy(self)
+        return Circuito(self.portas, self.tamanho_circuito, self.bits_extras, dict(self.mapeamento))
 
     def reduz_linhas(self):
         mapeamento = dict()
@@ -713,8 +684,7 @@ class Circuito:
 
         # logger.debug(f'MAP: {mapeamento}')
 
-        for porta in self.portas:
-            porta.modifica_linhas(mapeamento)
+        self.portas = [porta.modifica_linhas(mapeamento) for porta in self.portas]
 
     def obtem_linhas_de_alvo_usadas(self):
         linhas_usadas = set()
@@ -753,10 +723,37 @@ class Circuito:
         self.portas.insert(indice, porta)
         self.atualiza_informacoes()
 
-    # def adiciona_porta(self, porta):
-    #    uma_porta = copy.deepcopy(porta)
-    #    self.portas.append(uma_porta)
-    #    self.__atualiza_informacoes()
+    def adiciona_porta(self, porta):
+        """
+        Adiciona uma porta ao final do circuito em O(1), atualizando os custos incrementalmente.
+        """
+        self.portas.append(porta)
+        self.gc += 1
+        self.qc += porta.calcula_custo_quantico()
+
+    def estende(self, portas):
+        """
+        Adiciona ao final do circuito (no próprio circuito) as portas de outro circuito ou de uma lista de portas,
+        em tempo linear na quantidade de portas adicionadas. Ao estender com um circuito, a quantidade de variáveis
+        e de ancillas passa a ser a maior entre os dois, como em `__add__`.
+        """
+        if isinstance(portas, Circuito):
+            self.tamanho_circuito = max(self.tamanho_circuito, portas.tamanho_circuito)
+            self.bits_extras = max(self.bits_extras, portas.bits_extras)
+            self.portas.extend(portas.portas)
+            self.gc += portas.gc
+            self.qc += portas.qc
+            return self
+
+        for porta in portas:
+            self.adiciona_porta(porta)
+        return self
+
+    def __iadd__(self, other):
+        if not isinstance(other, self.__class__):
+            raise Exception('Tipo Circuito somente pode ser concatenado com outro de mesmo tipo.')
+
+        return self.estende(other)
 
     def custo_porta(self):
         return len(self.portas)
@@ -789,37 +786,58 @@ class Circuito:
         if qtd_bits is None:
             qtd_bits = self.obtem_quantidade_de_bits()
 
-        elementos = gera_permutacao(qtd_bits)
-        # logger.debug(f'Permutacao Inicial: {elementos}')
-        # logger.debug(f'Mapeamento: {self.mapeamento}')
+        estados = self.obtem_permutacao_estados(qtd_bits)
 
-        inverte_elementos(elementos)
+        return tuple(format(e, f'0{qtd_bits}b') for e in estados.tolist())
+
+    def obtem_permutacao_estados(self, qtd_bits=None):
+        """
+        Mesmo que `obtem_permutacao`, mas retorna um vetor de inteiros: a posição `i` contém a imagem de `i`, com o
+        bit `j` de cada inteiro sendo o valor da linha `j`.
+        """
+        if qtd_bits is None:
+            qtd_bits = self.obtem_quantidade_de_bits()
+
+        estados = np.arange(2 ** qtd_bits, dtype=tipo_estados(qtd_bits))
+        return self.aplica_estados(estados)
+
+    def aplica_estados(self, estados):
+        """
+        Aplica todas as portas (no próprio vetor) a um vetor de estados da base, veja `Toffoli.aplica_estados`.
+        """
         for porta in self.portas:
-            # logger.debug(f'Aplicando {porta}')
-            porta.roda_porta_permutacao(elementos)
-            # logger.debug(f'Aplicado {elementos}')
-        inverte_elementos(elementos)
+            porta.aplica_estados(estados)
 
-        return tuple(elementos)
+        return estados
 
     def obtem_tabela_verdade(self, n=None, ancillas=None):
+        """
+            Simula o circuito para as 2^n entradas (ancillas em 0).
+        :return: Uma matriz de bits com uma linha por entrada (a linha 0 do circuito é o bit mais significativo do
+        índice) e uma coluna para cada uma das n + ancillas linhas do circuito.
+        """
         if n is None:
             n = self.tamanho_circuito
 
         if ancillas is None:
             ancillas = self.bits_extras
 
-        tab_vdd = gera_tabela_verdade(n, ancillas=ancillas)
-        # tabela_verdade = list(tab_vdd)
-        tabela_verdade = np.fromiter(tab_vdd, dtype=np.dtype((np.uint8, n)), count=2**n)
-        # tabela_verdade = np.zeros(shape=(2**n, n), dtype=np.uint8)
-        # for i, k in enumerate(tab_vdd):
-        #     tabela_verdade[i] = k
+        estados = self.aplica_estados(gera_estados_da_base(n, ancillas))
 
-        for porta in self.portas:
-            porta.roda_porta_tabela_verdade(tabela_verdade)
+        return estados_para_tabela(estados, n + ancillas)
 
-        return tabela_verdade
+    def eh_equivalente(self, other, n=None, ancillas=None):
+        """
+            Verifica se os dois circuitos levam cada uma das 2^n entradas (ancillas em 0) à mesma saída.
+        """
+        if n is None:
+            n = max(self.tamanho_circuito, other.tamanho_circuito)
+
+        if ancillas is None:
+            ancillas = max(self.bits_extras, other.bits_extras)
+
+        estados = gera_estados_da_base(n, ancillas)
+        return np.array_equal(self.aplica_estados(estados.copy()), other.aplica_estados(estados))
 
     def obtem_portas_string(self):
         s = [str(porta) for porta in self.portas]
@@ -903,8 +921,112 @@ class Circuito:
             yield porta
 
 
+def le_circuito_tfc(conteudo: str) -> Circuito:
+    """
+    Reconstroi um Circuito a partir da sua representacao TFC (o texto gerado por `Circuito.__repr__`
+    ou gravado por `Circuito.salva_em_arquivo`).
+
+    :param conteudo: O texto TFC do circuito.
+    :return: O circuito equivalente.
+    """
+    ancillas = 0
+    linhas_vars = list()
+    portas = list()
+    dentro = False
+
+    for linha in conteudo.splitlines():
+        linha = linha.strip()
+
+        if linha.startswith('#'):
+            encontrado = re.search(r'ANCILLAS\s*=\s*(\d+)', linha)
+            if encontrado:
+                ancillas = int(encontrado.group(1))
+
+        elif linha.startswith('.v'):
+            partes = linha.split(' ', 1)
+            if len(partes) > 1 and partes[1].strip() != '':
+                linhas_vars = partes[1].split(',')
+
+        elif linha == 'BEGIN':
+            dentro = True
+
+        elif linha == 'END':
+            dentro = False
+
+        elif dentro and linha != '':
+            _, operandos = linha.split(' ', 1)
+            operandos = [op.strip() for op in operandos.split(',')]
+
+            mascara = 0
+            polaridade = 0
+            for op in operandos[:-1]:
+                linha = int(op.strip("'")[1:])
+                mascara |= 1 << linha
+                if not op.endswith("'"):
+                    polaridade |= 1 << linha
+
+            alvo = int(operandos[-1].strip("'")[1:])
+            portas.append(Toffoli.de_mascaras(alvo, mascara, polaridade))
+
+    qtd_vars = len(linhas_vars) - ancillas
+    return Circuito(portas, qtd_vars, ancillas=ancillas)
+
+
 def extrai_coluna_da_matriz(matriz, posicao):
-    return [int(linha[posicao]) for linha in matriz]
+    return [None if linha[posicao] is None else int(linha[posicao]) for linha in matriz]
+
+
+def sao_compativeis(f1, f2):
+    """
+    Verifica se duas funções parcialmente especificadas podem ser iguais, isto é, se diferem apenas em
+    posições em que alguma delas é indiferente (None).
+    """
+    return all(a is None or b is None or a == b for a, b in zip(f1, f2))
+
+
+def une_funcoes(f1, f2):
+    """
+    Une duas funções compatíveis, mantendo os valores especificados em qualquer uma delas.
+    """
+    return [b if a is None else a for a, b in zip(f1, f2)]
+
+
+def nega_funcao(f):
+    return [None if v is None else 1 - v for v in f]
+
+
+def resolve_indiferencas(g):
+    """
+        Atribui valores às entradas indiferentes (don't cares, representadas por None) de uma função, escolhendo-os
+        de forma a favorecer os casos que `processa_permutacao` resolve sem recursão: funções constantes, metades
+        iguais (a variável mais significativa some da expressão) e metades complementares (a variável aparece
+        apenas como um termo linear). Quando nenhum dos casos se aplica, cada metade é resolvida separadamente.
+
+    :param g: A função (lista de 0, 1 ou None).
+    :return: A função completamente especificada.
+    """
+    if None not in g:
+        return g
+
+    valores = set(g)
+    valores.discard(None)
+    if len(valores) <= 1:
+        return [valores.pop() if valores else 0] * len(g)
+
+    metade = len(g) // 2
+    primeira_metade = g[:metade]
+    segunda_metade = g[metade:]
+
+    if sao_compativeis(primeira_metade, segunda_metade):
+        r = resolve_indiferencas(une_funcoes(primeira_metade, segunda_metade))
+        return r + r
+
+    negada = nega_funcao(segunda_metade)
+    if sao_compativeis(primeira_metade, negada):
+        r = resolve_indiferencas(une_funcoes(primeira_metade, negada))
+        return r + nega_funcao(r)
+
+    return resolve_indiferencas(primeira_metade) + resolve_indiferencas(segunda_metade)
 
 
 def gera_circuito(expressao, alvo, ancillas, qtd_vars, prefixo='b'):
@@ -921,6 +1043,70 @@ def gera_circuito(expressao, alvo, ancillas, qtd_vars, prefixo='b'):
     return Circuito(portas_circuito, qtd_vars, ancillas=ancillas)
 
 
+def gera_porta_termo(termo, alvo):
+    """
+    Gera a porta Toffoli de um termo `(positivos, negativos)`.
+    """
+    positivos, negativos = termo
+
+    if type(alvo) is not int:
+        alvo, = alvo
+
+    return Toffoli.de_mascaras(alvo, positivos | negativos, positivos)
+
+
+def gera_circuito_termos(termos, alvo, ancillas, qtd_vars):
+    portas_circuito = [gera_porta_termo(termo, alvo) for termo in termos]
+    return Circuito(portas_circuito, qtd_vars, ancillas=ancillas)
+
+
+def gera_circuito_compartilhado(termos_por_saida, qtd_vars):
+    """
+    Gera um único circuito para várias saídas, calculando uma só vez os termos que aparecem em mais de uma saída.
+
+    Os termos são agrupados pelo conjunto de saídas em que aparecem. Os termos de um grupo com mais de uma saída são
+    aplicados apenas na primeira linha de alvo do grupo, e CNOTs dessa linha para as demais antes e depois (fan-out)
+    repassam a elas o XOR dos termos: `t_j ^= t_1`, `t_1 ^= termos`, `t_j ^= t_1` resulta em `t_j ^= termos`.
+    O fan-out só é usado quando custa menos que repetir os termos em cada saída.
+
+    :param termos_por_saida: Lista com os termos `(positivos, negativos)` de cada saída, a saída i na linha qtd_vars + i.
+    :param qtd_vars: Quantidade de variáveis (linhas de controle).
+    :return: O circuito com uma linha de alvo para cada saída.
+    """
+    saidas_por_termo = dict()
+    for saida, termos in enumerate(termos_por_saida):
+        for termo in termos:
+            saidas = saidas_por_termo.setdefault(termo, dict())
+            # um termo repetido na mesma saída se cancela
+            if saidas.pop(saida, None) is None:
+                saidas[saida] = True
+
+    grupos = dict()
+    for termo, saidas in saidas_por_termo.items():
+        if saidas:
+            grupos.setdefault(tuple(saidas), list()).append(termo)
+
+    circuito = Circuito(qtd_vars=qtd_vars, ancillas=len(termos_por_saida))
+    for saidas, termos in grupos.items():
+        alvo = qtd_vars + saidas[0]
+        portas = [gera_porta_termo(termo, alvo) for termo in termos]
+
+        leque = [Toffoli.de_mascaras(qtd_vars + saida, 1 << alvo, 1 << alvo) for saida in saidas[1:]]
+        custo_termos = sum(porta.calcula_custo_quantico() for porta in portas)
+        custo_leque = sum(porta.calcula_custo_quantico() for porta in leque)
+
+        if not leque or custo_termos * len(leque) <= 2 * custo_leque:
+            for saida in saidas:
+                circuito.estende(gera_porta_termo(termo, qtd_vars + saida) for termo in termos)
+            continue
+
+        circuito.estende(leque)
+        circuito.estende(portas)
+        circuito.estende(leque)
+
+    return circuito
+
+
 def extrai_portas(expressao, alvo):
     # reduz espaços da expressão
     expressao = ' '.join(expressao.split())
@@ -979,7 +1165,12 @@ def gera_estados(n: int, alvos: List[int], prefixo: str = 'x'):
 
 
 def processa_permutacao(g, n, estados, nivel=0, prefixo='x', alvo=0):
-    return processa_permutacao_aux(g, n, estados, nivel, prefixo, alvo)
+    """
+    Gera a expressão ESOP (Reed-Muller) da função `g` como texto, com as variáveis nomeadas por `estados`.
+    A síntese usa `processa_termos` diretamente, esta função apenas converte os termos.
+    """
+    termos = processa_termos(g, n, list(range(len(estados))), nivel)
+    return termos_para_expressao(termos, estados)
 
 XOR = '⊕'
 VAZIO = 'Ø'
@@ -1030,54 +1221,46 @@ def transforma_saida_funcao(f):
     respectively replaced by the {1, −1} values.
     """
 
-    g = list()
-    t = {0: 1, 1: -1}
+    f = np.asarray(f)
+    if f.size and ((f != 0) & (f != 1)).any():
+        raise Exception("The function contains errors. The output must contain only 0's and 1's")
 
-    for i in f:
-        e = t.get(i)
-
-        if e:
-            g.append(e)
-        else:
-            raise Exception("The function contains errors. The output must contain only 0's and 1's")
+    return (1 - 2 * f).astype(np.int8)
 
-    return np.array(g, dtype=np.int8)
 
-
-def gera_matriz_walsh_hadamard(n):
+def transformada_walsh_hadamard(f):
     """
-    Walsh functions can be generated in a recursive way by using the Hadamard
-    matrix (Hurst et al., 1985).
+    Fast Walsh-Hadamard transform, the product of the Hadamard matrix in Sylvester (natural) order
 
     Tw(0) = [1]
     Tw(n) = [ [Tw(n - 1), Tw(n - 1)], [Tw(n - 1), -Tw(n - 1)] ]
-    """
 
-    h0 = np.array([[1, 1], [1, -1]], dtype=np.int8)
-    h = h0
-    while len(h) < n:
-        h = np.kron(h, h0)
+    by the vector `f`, computed with n butterfly stages in O(n·2^n) time and without building the matrix.
+    The coefficients of a ±1 vector are bounded by 2^n, so they are accumulated in int32 (int64 for n > 30).
+    """
 
-    return h
+    n = int(log2(len(f)))
+    s = np.array(f, dtype=np.int32 if n <= 30 else np.int64)
 
+    h = 1
+    while h < len(s):
+        pares = s.reshape(-1, 2, h)
+        primeira = pares[:, 0, :].copy()
+        pares[:, 0, :] += pares[:, 1, :]
+        pares[:, 1, :] = primeira - pares[:, 1, :]
+        h *= 2
 
-def multiplica_matrizes(h, f):
-    """
-    add @measure to test performance on this function.
+    return s
 
-    Function Name       : multiplica_matrizes (with matmul)
-    Elapsed time        :     0.0189 msecs
-    Current memory usage:     0.0006 MB
-    Peak                :     0.0009 MB
 
-    Function Name       : multiplica_matrizes (with dot)
-    Elapsed time        :     0.0285 msecs
-    Current memory usage:     0.0015 MB
-    Peak                :     0.0068 MB
+def paridade(x):
     """
-
-    s = np.matmul(h, f)
-    return s
+    Paridade (quantidade de bits 1 módulo 2) de cada elemento de um vetor de inteiros não negativos de até 64 bits.
+    """
+    x = np.array(x, dtype=np.uint64)
+    for deslocamento in (32, 16, 8, 4, 2, 1):
+        x ^= x >> np.uint64(deslocamento)
+    return (x & np.uint64(1)).astype(np.uint8)
 
 
 def aplica_funcao_s(coef):
@@ -1088,86 +1271,48 @@ def aplica_funcao_s(coef):
     100 --> 3 --> x1
     ...
     111 --> 7 --> x1x2x3
-    """
 
-    coef = list(coef)
-    n = int(log2(len(coef)))
+    The linear function of the largest magnitude coefficient at position `pos` is `parity(i & pos)` on entry `i`,
+    complemented on its variables when the coefficient is negative.
+    """
 
     valor, pos = identifica_maior_magnitude(coef)
-    r = f'{pos:b}'.zfill(n)
 
-    negado = False
-    if valor < 0:
-        negado = True
+    saida = paridade(np.arange(len(coef)) & pos)
 
-    # [f'x{j+1}' if x == '1' else '' for j, x in enumerate('111')]
+    if valor < 0 and f'{pos:b}'.count('1') % 2 == 1:
+        saida ^= 1
 
-    linhas = list()
-    for i in range(len(coef)):
-        str_linha = f'{i:b}'.zfill(n)
-        linha = list(str_linha)
-        # logger.debug(f'antes == {linha=}', end='\t')
-
-        for j, x in enumerate(r):
-            if x == '1':
-                if negado:
-                    linha[j] = '0' if linha[j] == '1' else '1'
-
-        # logger.debug(f'depois == {linha=}')
-        linhas.append(linha)
-
-    saida = list()
-    for linha in linhas:
-        t = list()
-
-        for j, x in enumerate(r):
-            if x == '1':
-                k = int(linha[j])
-                t.append(k)
-
-        # logger.debug(f'T antes  > {t}')
-        t = reduz_linha_xor(t)
-        # logger.debug(f'T depois > {t}')
-        saida.append(t)
-
-    return saida
+    return saida.tolist()
 
 
 def reduz_linha_xor(lin):
     """
     x1 ^ x2 ==> x1 XOR x2
     """
-    if len(lin) < 1:
-        return 0
-    ll = [str(x) for x in lin]
-    tt = '^'.join(ll)
-    res = eval(tt)
+    res = 0
+    for x in lin:
+        res ^= int(x)
     return res
 
 
-def executa_linha(f0, estados, nivel, alvo=0):
+def executa_linha(f0, linhas, nivel=0):
     f1 = transforma_saida_funcao(f0)
     # espacos = '   ' * nivel
 
-    # https://docs.scipy.org/doc/scipy/reference/generated/scipy.linalg.hadamard.html
-    n = len(f0)
-    wh = gera_matriz_walsh_hadamard(n)
-    # logger.debug(f'WH = {wh}')
-
-    s = multiplica_matrizes(wh, f1)
+    s = transformada_walsh_hadamard(f1)
 
     fn = aplica_funcao_s(s)
 
     d = concordancia_de_funcoes(f0, fn)
 
-    r0 = d.count(0)
-    r1 = d.count(1)
+    r1 = sum(d)
+    r0 = len(d) - r1
     r = min(r0, r1) / len(fn)
 
-    eq_d = gera_equacao_d(s, estados, alvo=alvo)
-    # logger.debug(f'EQ = {eq_d}')
+    termos_d = termos_equacao_d(s, linhas)
 
-    return r, eq_d, d
+    return r, termos_d, d
 
 
 def identifica_maior_magnitude(coeficiente_espectral):
@@ -1176,46 +1321,41 @@ def identifica_maior_magnitude(coeficiente_espectral):
     for the coefficient s1 = −6. Hence, f(x) = f(x3).
 
     Example: [2, −6, 2, 2, −2, −2, −2, −2]
-    """
 
-    magnitudes = coeficiente_espectral[:]
-    magnitudes.sort(key=abs, reverse=True)
+    Ties are broken by the smallest position.
+    """
 
-    maior_magnitude = magnitudes[0]
-    posicao = coeficiente_espectral.index(maior_magnitude)
+    coeficiente_espectral = np.asarray(coeficiente_espectral)
+    posicao = int(np.argmax(np.abs(coeficiente_espectral)))
+    maior_magnitude = int(coeficiente_espectral[posicao])
 
     return maior_magnitude, posicao
 
 
 
-def gera_equacao_d(coef, estados, simbolo_xor='⊕', alvo=0):
+def termos_equacao_d(coef, linhas):
+    """
+    Termos da função linear do coeficiente de maior magnitude, um literal por variável (todos negados quando o
+    coeficiente é negativo).
+    """
     n = int(log2(len(coef)))
-    coef = list(coef)
-    variaveis = list()
 
     valor, pos = identifica_maior_magnitude(coef)
-    eq = ''
-
-    variaveis += gera_string_binaria_equivalente(pos, estados, n, gerar_negativos=False, alvo=alvo)
-
-    if len(variaveis) > 0 and valor < 0:
-        variaveis.append('1')
 
-    if '1' in variaveis:
-        variaveis2 = list()
+    termos = list()
+    for j in range(n):
+        if (pos >> (n - 1 - j)) & 1:
+            mascara = 1 << linhas[j]
+            termos.append((0, mascara) if valor < 0 else (mascara, 0))
 
-        for v in variaveis:
-            if v != '1':
-                v = f'~{v}'
-                variaveis2.append(v)
+    return termos
 
-        variaveis = variaveis2
 
-    eq += f' {simbolo_xor} '.join(variaveis)
-    # eq += f' {simbolo_xor} '
-
-
-    return eq.strip(f' {simbolo_xor} ')
+def gera_equacao_d(coef, estados, simbolo_xor='⊕', alvo=0):
+    termos = termos_equacao_d(coef, list(range(len(estados))))
+    if len(termos) == 0:
+        return ''
+    return termos_para_expressao(termos, estados, simbolo_xor)
 
 
 def concordancia_de_funcoes(f1, f2):
@@ -1227,20 +1367,12 @@ def concordancia_de_funcoes(f1, f2):
     d(x) = 0 for f(x) == fs(x).
     """
 
-    d = list()
-
     if len(f1) != len(f2):
         raise Exception("The function contains errors. Functions should have the same length.")
 
-    for i in range(len(f1)):
-        x1 = f1[i]
-        x2 = f2[i]
+    d = np.asarray(f1) != np.asarray(f2)
 
-        r = 1 if x1 != x2 else 0
-
-        d.append(r)
-
-    return d
+    return d.astype(np.uint8).tolist()
 
 
 def determina_quantidades_de_bits(d):
@@ -1254,173 +1386,202 @@ def particiona_permutacao(dh, k=0, n=None):
     if n is None:
         n = determina_quantidades_de_bits(dh)
 
-    dh1 = list()
-    dh2 = list()
-
-    for i, h in enumerate(dh):
-        r = f'{i:b}'.zfill(n)
+    bit = 1 << (n - 1 - k)
 
-        if r[k] == '0':
-            dh1.append(h)
-        else:
-            dh2.append(h)
+    dh1 = [h for i, h in enumerate(dh) if not i & bit]
+    dh2 = [h for i, h in enumerate(dh) if i & bit]
 
     return [dh1, dh2]
 
 
-# n: quantidade de bits (inclui o alvo?) supomos que sim
-def processa_permutacao_aux(g, n, estados, nivel=0, prefixo='x', alvo=0):
-    # logger.debug(f'Entrando na recursão nível {nivel}')
-
-    # se DH possui apenas 1, então termina (equação é igual a 1)
-    if g.count(1) == len(g):
-        # logger.debug(f'Encontrei uma G sem entrada nula')
-        return f'1'
+UM = (0, 0)
 
-    # se DH está zerado, então termina (equação vazia)
-    if [0] * len(g) == g:
-        # logger.debug(f'Equação (zerada) == {g}')
-        return f'{VAZIO}'
 
-    if g.count(1) < 2:
-        # logger.debug(f'Encontrei uma G com apenas uma entrada não nula')
-        posicao = g.index(1)
-        str_bin = gera_string_binaria_equivalente(posicao, estados, n, gerar_negativos=True, alvo=alvo)
-        equacao = ' . '.join(str_bin)
+def linhas_da_mascara(mascara):
+    """
+    Lista as linhas (posições dos bits 1) de uma máscara, em ordem crescente.
+    """
+    linhas = list()
+    while mascara:
+        menor = mascara & -mascara
+        linhas.append(menor.bit_length() - 1)
+        mascara ^= menor
+    return linhas
 
-        return equacao
 
-    # se DH tem menos de dois elementos, então termina
-    if len(g) < 2:
-        # logger.debug(f'Equação (tam<2) == {g}')
-        # return f'?'
-        return f'1'
+def termo_minterm(posicao, linhas, n):
+    """
+    Termo (produto de todas as variáveis) que vale 1 apenas na entrada `posicao`. A variável mais significativa
+    da entrada corresponde a `linhas[0]`.
+    """
+    positivos = 0
+    negativos = 0
 
-    metade_tamanho = len(g) // 2
-    primeira_metade_g = g[0:metade_tamanho]
-    segundo_metade_g = g[metade_tamanho:len(g)]
-    if primeira_metade_g == segundo_metade_g:
-        novos_estados = estados[:]
-        del novos_estados[0]
+    for j in range(n):
+        if (posicao >> (n - 1 - j)) & 1:
+            positivos |= 1 << linhas[j]
+        else:
+            negativos |= 1 << linhas[j]
 
-        v = processa_permutacao_aux(g=primeira_metade_g, n=n - 1, estados=novos_estados, nivel=nivel + 1,
-                                    prefixo=prefixo, alvo=alvo)
+    return positivos, negativos
 
-        return v
 
-    espacos = '   ' * nivel
-    _, eqd, dh = executa_linha(g, estados, nivel, alvo=alvo - nivel)
+def termo_para_string(termo, nomes, simbolo_and=AND):
+    positivos, negativos = termo
+    if termo == UM:
+        return '1'
 
-    # Equação total (ou final) --- resposta da recursão
-    eqt = []
+    literais = list()
+    for linha in linhas_da_mascara(positivos | negativos):
+        negado = '~' if (negativos >> linha) & 1 else ''
+        literais.append(f'{negado}{nomes[linha]}')
 
-    # se a equação encontra neste nível da recursão é vazia, ou
-    # se a equação é simplesmente igual a 1, dai retorna vazio
-    # c.c. junta a equação encontrada neste nível com a equação anterior (encontrada nos niveis acima)
-    if eqd == '' or eqd.strip() == '1':
-        eqd = f'{VAZIO}'
-    else:
-        eqt.append(eqd)
+    return f' {simbolo_and} '.join(literais)
 
-    if dh.count(1) == 1:
-        # logger.debug(f'\t\t\tDH:{dh}')
 
-        # logger.debug(f'\t*\tfinal: {v0} &\t {v1}')
-        idx = dh.index(1)
-        valor_str = f'{idx:b}'.zfill(n)
-        # logger.debug(f'IDX - valor str:{valor_str}')
+def termos_para_expressao(termos, nomes, simbolo_xor=XOR):
+    """
+    Converte uma lista de termos na expressão equivalente em texto (`Ø` quando não há termos).
+    """
+    if len(termos) == 0:
+        return f'{VAZIO}'
 
-        posicao = dh.index(1)
-        str_bin = gera_string_binaria_equivalente(posicao, estados, n, gerar_negativos=True, alvo=alvo)
-        eqd = ' . '.join(str_bin)
+    return f' {simbolo_xor} '.join(termo_para_string(termo, nomes) for termo in termos)
 
-        eqt.append(eqd)
 
-        eq = f' {XOR} '.join(eqt)
-        return eq
+def espectro_da_diferenca(espectro, pos, complemento):
+    """
+    Espectro de d(x) = g(x) ⊕ fs(x) a partir do espectro de g, sem uma nova transformada: na codificação S, d é o
+    produto de g pela função linear fs = paridade(x & pos) (⊕ 1 quando complementada), e multiplicar pela função
+    linear apenas troca o coeficiente u pelo u ⊕ pos (e inverte o sinal quando complementada).
+    """
+    d = espectro[np.arange(len(espectro)) ^ pos]
+    return -d if complemento else d
 
-    n -= 1
 
-    ##### REMOVER DEPOIS
-    eq1 = ''
-    eq2 = ''
-    #####
+def espectros_das_metades(espectro):
+    """
+    Espectros das duas metades da função (variável mais significativa em 0 e em 1), desfazendo o último estágio
+    de borboletas da transformada: S[u] = A[u] + B[u] e S[u + 2^(n-1)] = A[u] - B[u].
+    """
+    metade = len(espectro) // 2
+    baixo, alto = espectro[:metade], espectro[metade:]
+    return (baixo + alto) // 2, (baixo - alto) // 2
 
-    # logger.debug(f'n:{n}')
-    if dh != [0] * n:
-        # se novo DH não está zerado, particiona
-        g1, g2 = particiona_permutacao(dh, k=0)
 
-        # logger.debug(f'{espacos}EQ_D{nivel} = {eqd}')
-        # logger.debug(f'{espacos}FP{nivel} = {eqd}')
-        # logger.debug(f'{espacos}Particionando F{nivel} = {dh} em F{nivel + 1} = {g1} e F{nivel + 1}\' = {g2}')
+def processa_termos(g, n, linhas, nivel=0, espectro=None, memoria=None, base=None, prazo=None):
+    """
+        Gera a expressão ESOP (Reed-Muller) da função `g` através da análise espectral recursiva.
+
+        A expressão é uma lista de termos (produtos) e cada termo um par de máscaras de bits
+        `(positivos, negativos)`, com os controles positivos e negativos da porta correspondente. `[UM]` é a função
+        constante 1 e `[]` a função nula.
+
+        A transformada de Walsh-Hadamard é calculada apenas uma vez: o espectro de cada subfunção é obtido do
+        espectro do nível anterior (veja `espectro_da_diferenca` e `espectros_das_metades`), e subfunções iguais
+        são resolvidas uma única vez através de `memoria`. As subfunções pequenas o suficiente para a `base` de
+        ESOPs mínimas são consultadas nela em vez de seguir a recursão.
+
+    :param g: A função (lista ou vetor de 0 e 1).
+    :param n: Quantidade de variáveis da função.
+    :param linhas: A linha de cada variável, da mais significativa para a menos significativa.
+    :param nivel: O nível da recursão.
+    :param espectro: O espectro de `g`, quando já conhecido.
+    :param memoria: Dicionário com os termos das subfunções já resolvidas, pode ser compartilhado entre chamadas.
+    :param base: A base de ESOPs mínimas (`BaseESOP`); por padrão `obtem_base_padrao()`. Informe `False` para não
+        usar a base.
+    :param prazo: Instante (`time.monotonic`) a partir do qual a recursão é interrompida com `TempoEsgotado`.
+        `None` não limita o tempo.
+    :return: A lista de termos.
+    """
+    g = np.asarray(g, dtype=np.uint8)
+    uns = int(g.sum(dtype=np.int64))
 
-        # estados_temp = estados[:alvo] + estados[alvo+1:]
-        estados_temp = estados[1:]
-        # logger.debug(f'{L=} {i=} {Ltemp=}')
+    # se DH possui apenas 1, então termina (equação é igual a 1)
+    if uns == len(g):
+        return [UM]
 
-        ind = estados[0]
+    # se DH está zerado, então termina (equação vazia)
+    if uns == 0:
+        return []
 
-        # logger.debug(f'       tbl_vdd = {dh} \t\t qtd_1s = {dh.count(1)}')
-        # logger.debug(f'       tbl_g1 = {g1} \t\t qtd_1s = {g1.count(1)}')
-        # logger.debug(f'       tbl_g2 = {g2} \t\t qtd_1s = {g2.count(1)}')
+    # apenas uma entrada não nula, a equação é o mintermo correspondente
+    if uns == 1:
+        return [termo_minterm(int(np.argmax(g)), linhas, n)]
 
-        # antes o parâmetro era n-1
-        v0 = processa_permutacao_aux(g1, n, estados_temp, nivel + 1, prefixo, alvo - nivel)
-        # logger.debug(f'{"---" * nivel}expr_F{nivel + 1} = {v0}')
+    if memoria is None:
+        memoria = dict()
 
-        # antes o parâmetro era n-1
-        v1 = processa_permutacao_aux(g2, n, estados_temp, nivel + 1, prefixo, alvo - nivel)
-        # logger.debug(f'{"---" * nivel}expr_F{nivel + 1}\'= {v1}')
+    if base is None:
+        base = obtem_base_padrao()
 
-        # logger.debug(f'n:{n}')
+    chave = (tuple(linhas[:n]), g.tobytes())
+    if chave in memoria:
+        return list(memoria[chave])
 
-        # logger.debug(f'V0 = {v0}')
-        # logger.debug(f'V1 = {v1}')
+    if base and n <= base.variaveis_maximas:
+        eqt = base.consulta(g, linhas[:n])
+        memoria[chave] = eqt
+        return list(eqt)
 
-        if v0 == '1':
-            eq1 = f' ~{ind} '
-            eqt.append(eq1)
+    if prazo is not None and time.monotonic() > prazo:
+        raise TempoEsgotado(f'Síntese interrompida no nível {nivel}.')
 
-        elif v0 != f'{VAZIO}':
-            eq1t = list()
-            for variavel in v0.split(f'{XOR}'):
-                variavel = variavel.strip()
-                eq1t.append(f' ~{ind} . {variavel}')
+    metade_tamanho = len(g) // 2
+    if np.array_equal(g[:metade_tamanho], g[metade_tamanho:]):
+        espectro_metade = None if espectro is None else espectro[:metade_tamanho] // 2
+        eqt = processa_termos(g[:metade_tamanho], n - 1, linhas[1:], nivel + 1, espectro_metade, memoria, base, prazo)
+        memoria[chave] = eqt
+        return list(eqt)
 
-            eq1 = f' {XOR} '.join(eq1t)
-            # logger.debug(f'EQ1 ==> {eq1} :: EQ1T ==> {eq1t}')
+    if espectro is None:
+        espectro = transformada_walsh_hadamard(transforma_saida_funcao(g))
 
-            # eq1 = f' ~{ind} . ( ' + str(v0) + ' )'
-            eqt.append(eq1)
+    # Equação total (ou final) --- resposta da recursão
+    valor, pos = identifica_maior_magnitude(espectro)
+    complemento = valor < 0 and pos.bit_count() % 2 == 1
 
-        if v1 == '1':
-            eq2 = f' {ind} '
-            eqt.append(eq2)
+    eqt = termos_equacao_d(espectro, linhas)
 
-        elif v1 != f'{VAZIO}':
-            eq2t = list()
-            for variavel in v1.split(f'{XOR}'):
-                variavel = variavel.strip()
-                eq2t.append(f' {ind} . {variavel}')
+    dh = g ^ paridade(np.arange(len(g)) & pos)
+    if complemento:
+        dh ^= 1
 
-            eq2 = f' {XOR} '.join(eq2t)
-            # logger.debug(f'EQ2 ==> {eq2} :: EQ2T ==> {eq2t}')
+    uns = int(dh.sum(dtype=np.int64))
+    if uns == 1:
+        eqt.append(termo_minterm(int(np.argmax(dh)), linhas, n))
 
-            # eq2 = f' {ind} . ( ' + str(v1) + ' )'
-            eqt.append(eq2)
+    elif uns > 0:
+        # se novo DH não está zerado, particiona pela variável mais significativa
+        espectro_g1, espectro_g2 = espectros_das_metades(espectro_da_diferenca(espectro, pos, complemento))
+        ind = 1 << linhas[0]
 
-    # logger.debug(f'{eq1=}')
-    # logger.debug(f'{eq2=}')
-    # logger.debug(f'{eqt=}')
+        v0 = processa_termos(dh[:metade_tamanho], n - 1, linhas[1:], nivel + 1, espectro_g1, memoria, base, prazo)
+        v1 = processa_termos(dh[metade_tamanho:], n - 1, linhas[1:], nivel + 1, espectro_g2, memoria, base, prazo)
 
-    eq = f' {XOR} '.join(eqt)
-    # logger.debug(f'{espacos}FT{nivel} = {eq}')
+        eqt += [(positivos, negativos | ind) for positivos, negativos in v0]
+        eqt += [(positivos | ind, negativos) for positivos, negativos in v1]
 
-    return eq
+    memoria[chave] = eqt
+    return list(eqt)
 
 
-def executa_sintese(n, tabela_saida, prefixo='b'):
+def executa_sintese(n, tabela_saida, prefixo='b', mascara=None, compartilhar_termos=False, prazo=None):
+    """
+        Sintetiza o circuito (Reed-Muller) que calcula a tabela de saída, uma linha de alvo por coluna.
+
+    :param n: Quantidade de variáveis (linhas de controle).
+    :param tabela_saida: Tabela de saída, uma linha por entrada. Entradas iguais a None são indiferentes (don't cares).
+    :param prefixo: Prefixo das variáveis.
+    :param mascara: Máscara opcional de entradas indiferentes, com o formato da tabela ou uma posição por linha
+        (aplicada a todas as colunas). Os valores escolhidos para as entradas indiferentes são os que simplificam o
+        circuito (veja `resolve_indiferencas`).
+    :param compartilhar_termos: Sintetiza todas as saídas juntas, calculando uma única vez os termos comuns a mais de
+        uma saída (veja `gera_circuito_compartilhado`).
+    :param prazo: Instante (`time.monotonic`) a partir do qual a síntese é interrompida com `TempoEsgotado`.
+        `None` não limita o tempo.
+    :return: O circuito sintetizado.
+    """
     # verifica se a quantidad de linhas da entrada difere da quantidade de linhas de saída
     # if len(tabela_entrada) != len(tabela_saida):
     if (2 ** n) != len(tabela_saida):
@@ -1429,13 +1590,20 @@ def executa_sintese(n, tabela_saida, prefixo='b'):
     # infere alguns dados a partir das tabelas de entrada e saída
     # n = len(tabela_entrada[0])
 
+    # tabela de uma única saída em um vetor numpy (bit-planes)
+    if isinstance(tabela_saida, np.ndarray) and tabela_saida.ndim == 1:
+        tabela_saida = tabela_saida.reshape(-1, 1)
+
     # 2024-07-19: gambiarra?
-    if isinstance(tabela_saida[0], int):
+    if tabela_saida[0] is None or isinstance(tabela_saida[0], int):
         tabela_saida = [[i] for i in tabela_saida]
         # tabela_saida = [tabela_saida]
 
     ancillas = len(tabela_saida[0])
 
+    if mascara is not None:
+        mascara = np.asarray(mascara, dtype=bool).reshape(len(tabela_saida), -1)
+
     # extrai todas as funções possiveis, dada uma tabela de saída (considerando a entrada 000, 001, 010, ... 110, 111)
     ## F_i = a i-ésima saída da função original (diretamente da tabela de saída informada)
     ## FXOR_i = a i-ésima função F_i aplicando um XOR com o valor do alvo, ou seja, FXOR = F_i XOR i
@@ -1443,31 +1611,41 @@ def executa_sintese(n, tabela_saida, prefixo='b'):
     for i in range(ancillas):
         # extrai primeiramente os valores da i-ésima coluna
         f = extrai_coluna_da_matriz(tabela_saida, i)
+        if mascara is not None:
+            indiferentes = mascara[:, i if mascara.shape[1] > 1 else 0]
+            f = [None if indiferente else v for v, indiferente in zip(f, indiferentes)]
+        f = resolve_indiferencas(f)
         # f_alvo = extrai_coluna_da_matriz(tabela_entrada, i)
         # fxor = gera_f1_xor(f, f_alvo)
 
         # salva a F encontrada
         funcoes.append(f)
 
-    # gera o circuito de cada expressao reed-muller, para cada funcao encontrada no passo anterior
+    # gera a expressao reed-muller de cada funcao encontrada no passo anterior, as variáveis são as linhas 0 a n-1
+    # (a mais significativa na linha 0); colunas iguais são sintetizadas uma única vez
+    expressoes = dict()
+    memoria = dict()
+    termos_por_saida = list()
+    for fxor in funcoes:
+        chave = tuple(fxor)
+        if chave not in expressoes:
+            expressoes[chave] = processa_termos(fxor, n, list(range(n)), memoria=memoria, prazo=prazo)
+        termos_por_saida.append(expressoes[chave])
+
+    if compartilhar_termos:
+        return gera_circuito_compartilhado(termos_por_saida, n)
+
+    # gera o circuito de cada expressao, para cada linha de alvo
     circuitos = list()
-    for i, fxor in enumerate(funcoes):
-        # gera a lista de estados para uma determinada linha de alvo
+    for i, termos in enumerate(termos_por_saida):
         linha_de_alvo = [n + i]
-        estados = gera_estados(n, linha_de_alvo, prefixo=prefixo)
-        # gera a expressao
-        expressao = processa_permutacao(fxor, n, estados, prefixo=prefixo, alvo=i)
-        # limpa a expressao gerada: remove espacos desncessarios, parenteses, etc
-        expressao_tratada = substitui_simbolos(expressao)
-        expressao_tratada = expressao_tratada.replace('(', '').replace(')', '').strip()
-        # gera um circuito equivalente a partir da expressao encontrada
-        circuito = gera_circuito(expressao_tratada, alvo=linha_de_alvo, ancillas=ancillas, qtd_vars=n,
-                                 prefixo=prefixo)
+        # gera um circuito equivalente a partir dos termos encontrados
+        circuito = gera_circuito_termos(termos, alvo=linha_de_alvo, ancillas=ancillas, qtd_vars=n)
         circuitos.append(circuito)
 
     circuito_final = Circuito(qtd_vars=n, ancillas=ancillas)
     for c in circuitos:
-        circuito_final = circuito_final + c
+        circuito_final.estende(c)
 
     # logger.debug(f'Circuito Final:\n{circuito_final}')
     # circuito_final.reduz_linhas()
@@ -0,0 +1,139 @@
+import time
+import numpy as np
+
+from implementations.windowed_arithmetic.synthesis.otimizador import Circuito, Toffoli, TempoEsgotado, \
+    executa_sintese, gera_circuito_compartilhado, termo_minterm
+from implementations.windowed_arithmetic.synthesis.cache_sintese import normaliza_tabela
+from implementations.windowed_arithmetic.synthesis.hypercube import cria_portas_sintese_nova
+from implementations.windowed_arithmetic.synthesis.otimizacao_local import otimiza_circuito
+
+"""
+Síntese com orçamento (anytime): várias estratégias são tentadas, da mais rápida para a mais demorada, e o melhor
+circuito encontrado (menor custo quântico) é retornado quando o tempo acaba ou o custo alvo é atingido.
+
+Todas as estratégias geram o mesmo tipo de circuito de `executa_sintese`: as linhas 0 a n-1 são as variáveis (a
+linha 0 é o bit mais significativo da entrada) e a linha n + i recebe o XOR do bit i da saída.
+"""
+
+# a síntese pelo hipercubo trabalha com a permutação de todas as n + m linhas
+LINHAS_MAXIMAS_HIPERCUBO = 12
+
+
+def sintese_qrom(n, tabela):
+    """
+    QROM sem ancillas: um mintermo por entrada não nula, com os bits de saída de uma mesma entrada compartilhando o
+    mintermo através de CNOTs (veja `gera_circuito_compartilhado`).
+    """
+    linhas = list(range(n))
+    termos_por_saida = [[termo_minterm(int(r), linhas, n) for r in np.flatnonzero(coluna == 1)] for coluna in tabela.T]
+
+    return gera_circuito_compartilhado(termos_por_saida, n)
+
+
+def sintese_hipercubo(n, tabela):
+    """
+    Síntese da permutação (x, y) -> (x, y ⊕ f(x)) pelo hipercubo (`cria_portas_sintese_nova`). Como a permutação é a
+    sua própria inversa, a ordem das portas não importa. As entradas indiferentes recebem 0.
+    """
+    m = tabela.shape[1]
+    k = n + m
+
+    valores = np.zeros(2 ** n, dtype=np.int64)
+    for i in range(m):
+        valores |= (tabela[:, i] == 1).astype(np.int64) << i
+
+    # estado com o bit L igual ao valor da linha L, a linha j < n é o bit n - 1 - j da entrada
+    estados = np.arange(2 ** k, dtype=np.int64)
+    entradas = np.zeros(2 ** k, dtype=np.int64)
+    for j in range(n):
+        entradas |= ((estados >> j) & 1) << (n - 1 - j)
+
+    permutacao = estados ^ (valores[entradas] << n)
+
+    circuito = Circuito(qtd_vars=n, ancillas=m)
+    circuito.estende(Toffoli.de_mascaras(*porta) for porta in cria_portas_sintese_nova(k, permutacao.tolist()))
+
+    return circuito
+
+
+def sintese_reed_muller(n, tabela_saida, mascara=None, prazo=None):
+    return executa_sintese(n, tabela_saida, mascara=mascara, prazo=prazo)
+
+
+def sintese_reed_muller_compartilhada(n, tabela_saida, mascara=None, prazo=None):
+    return executa_sintese(n, tabela_saida, mascara=mascara, compartilhar_termos=True, prazo=prazo)
+
+
+ESTRATEGIAS = ('qrom', 'reed-muller compartilhado', 'reed-muller', 'hipercubo')
+
+
+def executa_sintese_com_orcamento(n, tabela_saida, tempo_limite=None, custo_alvo=None, mascara=None,
+                                  estrategias=ESTRATEGIAS, otimizar=True):
+    """
+        Sintetiza a tabela de saída tentando as estratégias em ordem, mantendo o circuito de menor custo quântico
+        (e menor quantidade de portas, no empate).
+
+        A primeira estratégia sempre é executada até o fim (garantindo um resultado) e as seguintes apenas enquanto
+        houver tempo e o custo alvo não tiver sido atingido. As sínteses Reed-Muller recebem o prazo e são
+        interrompidas (`TempoEsgotado`) quando ele acaba, sendo descartadas. O tempo que sobrar é usado na
+        otimização local (`otimiza_circuito`) do melhor circuito.
+
+    :param n: Quantidade de variáveis.
+    :param tabela_saida: Tabela de saída, nos formatos aceitos por `executa_sintese`.
+    :param tempo_limite: Tempo máximo, em segundos. `None` não limita o tempo.
+    :param custo_alvo: Custo quântico a partir do qual a busca é encerrada. `None` tenta todas as estratégias.
+    :param mascara: Máscara de entradas indiferentes, veja `executa_sintese`.
+    :param estrategias: As estratégias tentadas, em ordem (veja `ESTRATEGIAS`).
+    :param otimizar: Aplica a otimização local no melhor circuito encontrado.
+    :return: O melhor circuito encontrado e o nome da estratégia que o gerou.
+    """
+    inicio = time.monotonic()
+    prazo = None if tempo_limite is None else inicio + tempo_limite
+
+    tabela = normaliza_tabela(tabela_saida, mascara)
+    if len(tabela) != 2 ** n:
+        raise Exception('Tabela de saída incogruente com a tabela de entrada.')
+
+    if tabela.shape[1] == 1 and isinstance(tabela_saida, np.ndarray) and tabela_saida.ndim == 1:
+        tabela_saida = tabela_saida.reshape(-1, 1)
+
+    melhor = None
+    vencedora = None
+
+    for estrategia in estrategias:
+        if melhor is not None:
+            if prazo is not None and time.monotonic() >= prazo:
+                break
+            if custo_alvo is not None and melhor.qc <= custo_alvo:
+                break
+
+        # a primeira estratégia não é interrompida
+        prazo_estrategia = None if melhor is None else prazo
+
+        try:
+            match estrategia:
+                case 'qrom':
+                    circuito = sintese_qrom(n, tabela)
+                case 'reed-muller':
+                    circuito = sintese_reed_muller(n, tabela_saida, mascara, prazo_estrategia)
+                case 'reed-muller compartilhado':
+                    circuito = sintese_reed_muller_compartilhada(n, tabela_saida, mascara, prazo_estrategia)
+                case 'hipercubo':
+                    if n + tabela.shape[1] > LINHAS_MAXIMAS_HIPERCUBO:
+                        continue
+                    circuito = sintese_hipercubo(n, tabela)
+                case _:
+                    raise Exception(f'Estratégia desconhecida: {estrategia}.')
+        except TempoEsgotado:
+            break
+
+        if melhor is None or (circuito.qc, circuito.gc) < (melhor.qc, melhor.gc):
+            melhor = circuito
+            vencedora = estrategia
+
+    if otimizar and (custo_alvo is None or melhor.qc > custo_alvo):
+        restante = None if prazo is None else prazo - time.monotonic()
+        if restante is None or restante > 0:
+            melhor, _ = otimiza_circuito(melhor, restante)
+
+    return melhor, vencedora
@@ -1,10 +1,19 @@
 from qiskit import *
 from math import log2, ceil
+import numpy as np
 from qiskit.circuit.library import XGate, UnitaryGate, MCXGate
 from qiskit.circuit import Gate
-from implementations.windowed_arithmetic.synthesis.otimizador import executa_sintese
+from implementations.windowed_arithmetic.synthesis.cache_sintese import executa_sintese_com_cache
+from implementations.windowed_arithmetic.synthesis.otimizacao_local import otimiza_circuito
+from implementations.windowed_arithmetic.synthesis.sintese_orcamento import executa_sintese_com_orcamento
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from implementations.windowed_arithmetic.synthesis.hypercube import cria_circuito_sintese_nova
+from implementations.windowed_arithmetic.lookup_cache import LookupCache
+
+
+default_lookup_cache = LookupCache()
 
 
 def encode_table(l: list[int], size: int) -> list[str]:
@@ -27,6 +36,46 @@ def encode_table(l: list[int], size: int) -> list[str]:
     return encoded_l
 
 
+def encode_bit_planes(l: list[int], size: int) -> np.ndarray:
+    """Function encodes integers in a given list into bit-planes, the `i`-th row holds the `i`-th bit
+    (least significant first) of every element, i.e. the truth table of the `i`-th output bit.
+
+    Entries of any width are supported, widths up to 64 bits are converted with a single vectorized pass,
+    wider ones (RSA-sized moduli) are converted from their little-endian byte representation.
+
+    Exemple:
+    -
+    `[4,2,3,1] -> [[0,0,1,1], [0,1,1,0], [1,0,0,0]]` (with `size = 3`)
+
+    Args:
+        l (list[int]): list of non negative integers to be encoded.
+        size (int): how many bits elements should have in it's encoding.
+
+    Returns:
+        planes(np.ndarray): a `uint8` array of shape `(size, len(l))` with the bits of the elements in l.
+    """
+    entries = len(l)
+    if size <= 0 or entries == 0:
+        return np.zeros((max(size, 0), entries), dtype=np.uint8)
+
+    nbytes = (size + 7) // 8
+    if size <= 64:
+        values = np.fromiter(l, dtype="<u8", count=entries)
+        data = values.view(np.uint8).reshape(entries, 8)
+    else:
+        mask = (1 << size) - 1
+        buffer = b"".join((num & mask).to_bytes(nbytes, "little") for num in l)
+        data = np.frombuffer(buffer, dtype=np.uint8).reshape(entries, nbytes)
+
+    # one byte of every entry at a time, each byte is split into its 8 bit-planes
+    data = np.ascontiguousarray(data[:, :nbytes].T)
+    shifts = np.arange(8, dtype=np.uint8)[:, None]
+    planes = np.empty((nbytes * 8, entries), dtype=np.uint8)
+    for byte in range(nbytes):
+        np.bitwise_and(data[byte][None, :] >> shifts, 1, out=planes[8 * byte:8 * byte + 8])
+    return planes[:size]
+
+
 def generate_control_strings(size: int) -> list[str]:
     """Function generates a list of binary strings from `0` to `size`.
 
@@ -82,7 +131,29 @@ def x_data_gates(l: list[str], size: int) -> list[Gate]:
     return circuits
 
 
-def calculate_exp_table(W: int, a: int, N: int, only_odds: bool = False) -> list[int]:
+def x_data_gates_from_planes(planes: np.ndarray) -> list[Gate]:
+    """Same as `x_data_gates`, but reads the data directly from the bit-planes built by `encode_bit_planes`,
+    the ih-gate sets `|0>` to the i-th column of `planes`.
+
+    Args:
+        planes (np.ndarray): array of shape `(size, entries)` with the bits of every entry.
+
+    Returns:
+        circuits(list[Gate]): a list of quantum gates, one per entry.
+    """
+    size, entries = planes.shape
+    circuits = []
+    for i in range(entries):
+        qc = QuantumCircuit(size)
+        for bit in np.flatnonzero(planes[:, i]):
+            qc.x(int(bit))
+        gate = qc.to_gate()
+        gate.name = f"L{i}"
+        circuits.append(gate)
+    return circuits
+
+
+def calculate_exp_table(W: int, a: int, N: int, only_odds: bool = False, fill: int | None = 0) -> list[int]:
     """Given a base `a`, a modulo `N` and a window size `W` calculates the table
     `tbl[d] = a^d mod N, d = 1,2,3,...,2^W-1`
 
@@ -90,17 +161,19 @@ def calculate_exp_table(W: int, a: int, N: int, only_odds: bool = False) -> list
     -
     `calculate_exp_table(2,3,31)` -> `[1, 3, 9, 27]`
     `calculate_exp_table(2,3,31,True)` -> `[0, 3, 0, 27]`
+    `calculate_exp_table(2,3,31,True,None)` -> `[None, 3, None, 27]`
 
     Args:
         W (int): window size.
         a (int): base of the exponentiation.
         N (int): modulo of the exponentiation.
         only_odds (bool): define if calculates the operation for all values of `d` or only when `d` is odd.
+        fill (int | None): value of the even entries when `only_odds` is set, `None` marks them as don't cares for the lookup synthesis, `default = 0`.
     
     Returns:
         exp_table(list[int]): a list with the results from the exponentiation.
     """
-    exp_table = [0]*((1<<W))
+    exp_table = [fill if only_odds else 0]*((1<<W))
     (step, start) = (2,1) if only_odds else (1,0)
     for d in range(start,(1<<W),step):
         exp_table[d] = ((a**d) % N)
@@ -286,6 +359,56 @@ def tfc_str_to_qiskit(tfc_str, num_ctrl_qubits):
     return qc
 
 
+@lru_cache(maxsize=None)
+def mcx_gate(num_controls: int, ctrl_state: str) -> MCXGate:
+    """Returns a shared `MCXGate` for the given number of controls and control state,
+    building thousands of lookups would otherwise create one gate object per Toffoli.
+    """
+    return MCXGate(num_controls, ctrl_state=ctrl_state)
+
+
+def circuito_to_qiskit(circuito, num_ctrl_qubits: int) -> QuantumCircuit:
+    """Lowers a synthesized `Circuito` directly into a Qiskit QuantumCircuit,
+    producing the same circuit as `tfc_str_to_qiskit(circuito.__repr__(), num_ctrl_qubits)`
+    without formatting and re-parsing the TFC text. Controls on the target lines (the CNOT fan-out of
+    `executa_sintese(..., compartilhar_termos=True)`) are kept on their own qubit.
+
+    Args:
+        circuito (Circuito): the circuit returned by `executa_sintese`.
+        num_ctrl_qubits (int): Number of control qubits in the circuit
+
+    Returns:
+        QuantumCircuit: The equivalent Qiskit circuit
+    """
+    qr = QuantumRegister(circuito.tamanho_circuito + circuito.bits_extras, 'q')
+    qc = QuantumCircuit(qr)
+
+    for porta in circuito.portas:
+        target = qr[porta.alvo]
+        linhas = [linha for linha in range(porta.mascara.bit_length()) if (porta.mascara >> linha) & 1]
+        signs = [(porta.polaridade >> linha) & 1 for linha in linhas]
+        controls = [qr[num_ctrl_qubits - linha - 1] if linha < num_ctrl_qubits else qr[linha] for linha in linhas]
+        negated = [control for control, sign in zip(controls, signs) if not sign]
+
+        match len(controls):
+            case 0:
+                qc.x(target)
+            case 1 | 2:
+                for control in negated:
+                    qc.x(control)
+                if len(controls) == 1:
+                    qc.cx(controls[0], target)
+                else:
+                    qc.ccx(controls[0], controls[1], target)
+                for control in negated:
+                    qc.x(control)
+            case _:
+                ctrl_state = "".join("1" if sign else "0" for sign in reversed(signs))
+                qc.append(mcx_gate(len(controls), ctrl_state), controls + [target])
+
+    return qc
+
+
 def transform_to_permutation(orig_list: list[int], n_bits: int) -> list[int]:
     """ get unique permutation of elements from original list
     retulting list is a permutation where the last n_bits from each element represent the original value
@@ -306,47 +429,208 @@ def transform_to_permutation(orig_list: list[int], n_bits: int) -> list[int]:
 
 def complete_permutation(orig_list: list[int], n_bits: int) -> list[int]:
     """Completes the permutation by adding missing elements to the original list.
-    The resulting list will contain all integers from 0 to 2^n_bits -
+    The resulting list will contain all integers from 0 to 2^n_bits - 1.
+
+    The positions past the end of the list and the `None` (don't care) entries are free, each one receives the
+    missing element closest (in Hamming distance, up to 2) to its own position, which keeps the permutation close
+    to the identity and its synthesis small. When no missing element is that close the smallest one is used.
     """
-    for i in range(1<<n_bits):
-        if i not in orig_list:
-            orig_list.append(i)
+    size = 1 << n_bits
+    missing = set(range(size)).difference(orig_list)
+    fallback = iter(sorted(missing))
+
+    def closest(i):
+        if i in missing:
+            return i
+        for a in range(n_bits):
+            if i ^ (1 << a) in missing:
+                return i ^ (1 << a)
+        for a in range(n_bits):
+            for b in range(a+1, n_bits):
+                if i ^ (1 << a) ^ (1 << b) in missing:
+                    return i ^ (1 << a) ^ (1 << b)
+        for v in fallback:
+            if v in missing:
+                return v
+
+    for i in range(size):
+        if i < len(orig_list) and orig_list[i] is not None:
+            continue
+        v = closest(i)
+        missing.discard(v)
+        if i < len(orig_list):
+            orig_list[i] = v
+        else:
+            orig_list.append(v)
     return orig_list
 
 
-def build_index_circ(i: int, n: int, reg: QuantumRegister, aux: QuantumRegister, target: QuantumRegister, x_circs: list[QuantumCircuit], qc: QuantumCircuit):
-    if i == n:
-        return qc
-    if i == 0:
-        qc.ccx(reg[i], aux[i], aux[i+1], ctrl_state="10")
-    else:
-        qc.ccx(reg[i], aux[i], aux[i+1], "10")
-    
-    build_index_circ(i+1, n, reg, aux, target, x_circs, qc)
-    
-    if i == n-1:
-        qc.append(x_circs[0].control(1), aux[i+1:i+2] + target[:])
-        x_circs.pop(0)
-        qc.barrier()
+def synthesize_output_bits(window_size: int, output_str: list, max_workers: int | None = None, executor: str = "process", dont_care: np.ndarray | None = None) -> list:
+    """Synthesizes the circuit of every output bit column (as given by `get_output_string`), each column is an
+    independent `executa_sintese` call, so they can be run concurrently. The columns can also be the rows of
+    the bit-planes built by `encode_bit_planes`.
+
+    The resulting circuits are always returned in the same order of the columns, regardless of the order in which
+    the workers finish.
+
+    Args:
+        window_size (int): input (window) size in bits.
+        output_str (list | np.ndarray): the output bit columns.
+        max_workers (int | None): number of workers, `None` or `1` synthesizes the columns serially.
+        executor (str): `"process"` (default) or `"thread"`, the kind of pool used when `max_workers > 1`.
+        dont_care (np.ndarray | None): mask of the entries whose value does not matter, shared by every column, `default = None`.
 
-    qc.cx(aux[i], aux[i+1])
+    Returns:
+        circuits(list[Circuito]): the synthesized circuit of each column.
+    """
+    sizes = [window_size] * len(output_str)
+    prefixes = ["b"] * len(output_str)
+    caches = [None] * len(output_str)
+    masks = [dont_care] * len(output_str)
 
-    if i == n-1:
-        qc.append(x_circs[0].control(1), aux[i+1:i+2] + target[:])
-        x_circs.pop(0)
-        qc.barrier()
+    if max_workers is None or max_workers <= 1 or len(output_str) <= 1:
+        return list(map(executa_sintese_com_cache, sizes, output_str, prefixes, caches, masks))
 
-    build_index_circ(i+1, n, reg, aux, target, x_circs, qc)
+    match executor:
+        case "process":
+            pool = ProcessPoolExecutor(max_workers=max_workers)
+        case "thread":
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+        case _:
+            raise ValueError(f"Unknown executor '{executor}', use 'process' or 'thread'.")
 
-    if i == 0:
-        qc.ccx(reg[i], aux[i], aux[i+1])
-    else:
-        qc.ccx(reg[i], aux[i], aux[i+1])
+    with pool:
+        return list(pool.map(executa_sintese_com_cache, sizes, output_str, prefixes, caches, masks))
 
-    return qc
+
+def unary_iteration(qc: QuantumCircuit, address: list, anc: list):
+    """Iterative unary iteration over the segment tree of an address register`[1]`.
+
+    Walks the tree without recursion, appending to `qc` the Toffolis that compute the node indicators:
+    `anc[0]` is the control of the whole iteration, and `anc[i]` holds the indicator of the current node at
+    depth `i`, i.e. it is `|1>` only when `anc[0]` is set and the `i` most significant address bits match the node.
+    Sibling nodes are switched with a single CNOT, so the whole walk uses `2(2^n - 1)` Toffolis.
+
+    Every time a node becomes active the generator yields `(level, index, qubit)`, where `qubit` holds the
+    indicator of the node `index` (the value of its `level` most significant address bits), gates added to `qc`
+    controlled by `qubit` before resuming the generator act only on those addresses.
+    Leaves (`level == len(address)`) are visited in increasing order of the address.
+
+    Args:
+        qc (QuantumCircuit): circuit the gates are appended to.
+        address (list): the address qubits, most significant first.
+        anc (list): `len(address)+1` ancilla qubits, `anc[0]` is the control.
+
+    Yields:
+        (level, index, qubit)(tuple[int, int, Qubit]): the node that has just been activated.
+    """
+    n = len(address)
+
+    yield 0, 0, anc[0]
+    for i in range(n):
+        qc.ccx(address[i], anc[i], anc[i+1], ctrl_state="10")
+        yield i+1, 0, anc[i+1]
+
+    for x in range(1, 1 << n):
+        # the deepest level where the address of the previous leaf has a 0 bit that becomes 1
+        level = n - ((x ^ (x-1)).bit_length())
+        for i in range(n-1, level, -1):
+            qc.ccx(address[i], anc[i], anc[i+1])
+        qc.cx(anc[level], anc[level+1])
+        yield level+1, x >> (n-level-1), anc[level+1]
+        for i in range(level+1, n):
+            qc.ccx(address[i], anc[i], anc[i+1], ctrl_state="10")
+            yield i+1, x >> (n-i-1), anc[i+1]
+
+    for i in range(n-1, -1, -1):
+        qc.ccx(address[i], anc[i], anc[i+1])
 
 
-def compute_lookup_table(window_size: int, outBits: int, l: list[int], optimization: int = 0) -> QuantumCircuit:
+def node_data(planes: np.ndarray, level: int, index: int, address_size: int, differential: bool = False) -> np.ndarray | None:
+    """The bits written into the output register when the unary iteration activates the node `(level, index)`.
+
+    Without `differential` only the leaves write data, the entry they address. With `differential` the root writes
+    the first entry and every right child (odd `index`) writes the XOR between the first entry of its subtree and
+    the first entry of its parent's subtree, the writes along the path of an address then add up to its entry.
+
+    Args:
+        planes (np.ndarray): the table as returned by `encode_bit_planes`.
+        level (int): depth of the node.
+        index (int): the node, value of the `level` most significant address bits.
+        address_size (int): number of address bits.
+        differential (bool): use the differential data loading, `default = False`.
+
+    Returns:
+        bits(np.ndarray | None): the bits to be flipped, `None` when the node writes nothing.
+    """
+    def entry(i):
+        if i < planes.shape[1]:
+            return planes[:, i]
+        return np.zeros(planes.shape[0], dtype=np.uint8)
+
+    if not differential:
+        return entry(index) if level == address_size else None
+    if level == 0:
+        return entry(0)
+    if index % 2 == 0:
+        return None
+    shift = address_size - level
+    return entry((index - 1) << shift) ^ entry(index << shift)
+
+
+def load_data(qc: QuantumCircuit, planes: np.ndarray, address: list, anc: list, target: list, differential: bool = False) -> None:
+    """Writes the table `planes` into `target` through a unary iteration over `address`, i.e. the SELECT part of a lookup.
+
+    With `differential` each write flips only the bits that differ from entries already written higher up the
+    tree (see `node_data`), which saves CNOTs when neighbouring entries are alike.
+
+    Args:
+        qc (QuantumCircuit): circuit the gates are appended to.
+        planes (np.ndarray): the table as returned by `encode_bit_planes`.
+        address (list): the address qubits, most significant first.
+        anc (list): `len(address)+1` ancilla qubits, returned clean.
+        target (list): the qubits receiving the data, one per row of `planes`.
+        differential (bool): use the differential data loading, `default = False`.
+    """
+    qc.x(anc[0])
+    for level, index, qubit in unary_iteration(qc, address, anc):
+        bits = node_data(planes, level, index, len(address), differential)
+        if bits is None:
+            continue
+        for bit in np.flatnonzero(bits):
+            qc.cx(qubit, target[int(bit)])
+    qc.x(anc[0])
+
+
+def data_loading_cx_count(l: list[int], window_size: int, outBits: int) -> tuple[int, int]:
+    """Number of data CNOTs of a unary iteration lookup (`optimization = 0`) with the standard and the differential loading.
+
+    Exemple:
+    -
+    `data_loading_cx_count(calculate_mult_table(8, 3, 253), 8, 8) -> (1006, 766)`
+
+    Args:
+        l (list[int]): the table entries.
+        window_size (int): input (window) size in bits.
+        outBits (int): output size in bits.
+
+    Returns:
+        (standard, differential)(tuple[int, int]): the CNOT counts, the saving is `standard - differential`.
+    """
+    planes = encode_bit_planes(l, outBits)
+    standard = int(planes[:, :1 << window_size].sum())
+
+    differential = 0
+    for level in range(window_size + 1):
+        for index in range(1 << level):
+            bits = node_data(planes, level, index, window_size, differential=True)
+            if bits is not None:
+                differential += int(bits.sum())
+
+    return standard, differential
+
+
+def compute_lookup_table(window_size: int, outBits: int, l: list[int], optimization: int = 0, max_workers: int | None = None, executor: str = "process", block_size: int | None = None, differential: bool = False, optimize_time: float | None = None, shared_terms: bool = False, time_budget: float | None = None, bidirectional: bool = False, controlled: bool = False) -> QuantumCircuit:
     """Computes the lookup-table(QROM)`[1]`, the circuit takes an input `a` and has an effect of XOR'ing 
     the corresponding a-th value of the list `l` into the `outBits` output register.
 
@@ -381,11 +665,32 @@ def compute_lookup_table(window_size: int, outBits: int, l: list[int], optimizat
 
     - `o`, output register, takes `outBits` bits.
     - `w`, input register (window), takes `⌈log2|l|⌉` bits.
+    - `anc`, ancilla register (only with `optimization = 0` or `3`), takes `window_size+1` bits (`window_size-log2(block_size)+1` with `optimization = 3`) and is returned clean.
+    - `qroam`, ancilla register (only with `optimization = 3`), takes `block_size*outBits` bits and is returned clean.
+    - `ctrl`, control qubit (only with `controlled = True`), the first register of the circuit.
+
+    With `optimization = 3` the lookup is a SELECT-SWAP network (QROAM)`[2]`: the address is split into its high bits, used by
+    a unary iteration that writes whole blocks of `block_size` consecutive entries into the `qroam` register, and its
+    `log2(block_size)` low bits, that drive a controlled-swap network moving the wanted entry of the block into the first
+    `outBits` qubits of `qroam`. The entry is copied into the output register and everything else is undone, costing
+    `4(2^W/block_size - 1) + 2(block_size - 1)outBits` Toffolis (see `qroam_cost` and `choose_block_size`).
 
     Args:
         outBits (int): output size in bits.
         l (list[int]): list to be computed.
         optimization (int): the level of optimization the circuit should have, `default = 0`.
+        max_workers (int | None): with `optimization = 1`, number of workers synthesizing the output bits concurrently, `default = None` (serial).
+        executor (str): with `optimization = 1`, `"process"` or `"thread"` pool for the concurrent synthesis, `default = "process"`.
+        block_size (int | None): with `optimization = 3`, the number of entries loaded at once (a power of two up to `2^window_size`), `default = None` (picked by `choose_block_size`).
+        differential (bool): with `optimization = 0` or `3`, write only the differences between neighbouring entries (see `load_data`), `default = False`.
+        optimize_time (float | None): with `optimization = 1`, time budget in seconds of the peephole optimization (`otimiza_circuito`) of each synthesized output bit, `default = None` (not optimized).
+        shared_terms (bool): with `optimization = 1`, synthesize all the output bits as a single network that computes once the product terms shared by several bits (see `executa_sintese`), `default = False`.
+        time_budget (float | None): with `optimization = 1`, bound the synthesis to this many seconds, keeping the best network found by `executa_sintese_com_orcamento` (replaces `shared_terms` and `optimize_time`), `default = None` (unbounded). The name of the winning strategy is stored in `quantum_circuit.metadata["synthesis_strategy"]`.
+        bidirectional (bool): with `optimization = 2`, use the bidirectional hypercube synthesis (see `hipercubo`), which fixes each entry from the cheaper side and needs 10-20% fewer gates, `default = False` (the original one-directional network).
+        controlled (bool): with `optimization = 2`, add a control qubit (the `ctrl` register) to every gate of the permutation, the same as `.control(1)` on the lookup but without Qiskit's generic control synthesis, `default = False`.
+
+    Entries of `l` equal to `None` are don't cares: `optimization = 0` and `3` write nothing for them, `optimization = 1`
+    lets the synthesis choose their values and `optimization = 2` fills them with `complete_permutation`.
     
     Returns:
         quantum_circuit(QuantumCircuit): the quantum circuit implementing the lookup table (QROM).
@@ -394,40 +699,400 @@ def compute_lookup_table(window_size: int, outBits: int, l: list[int], optimizat
     -
     [1]Encoding Electronic Spectra in Quantum Circuits with Linear T Complexity.
     Ryan Babbush, Craig Gidney, Dominic W. Berry, Nathan Wiebe, Jarrod McClean, Alexandru Paler, Austin Fowler, and Hartmut Neven
+
+    [2]Trading T-gates for dirty qubits in state preparation and unitary synthesis.
+    Guang Hao Low, Vadym Kliuchnikov, and Luke Schaeffer
     """
 
+    if controlled and optimization != 2:
+        raise ValueError(f"controlled lookups are only built natively with optimization = 2, got {optimization}.")
+
     w = QuantumRegister(window_size, name="w")
     o = QuantumRegister(outBits, name="out")
-    
-    e_table = encode_table(l, outBits)
+
+    dont_care = np.array([v is None for v in l], dtype=bool)
+    planes = encode_bit_planes([0 if v is None else v for v in l], outBits)
     
     match optimization:
         case 0:
-            x_circs = x_data_gates(e_table, outBits)
             anc = QuantumRegister(window_size+1, "anc")
             quantum_circuit = QuantumCircuit(w, anc, o)
             quantum_circuit.name = "QROM"
-            quantum_circuit.x(anc[0])
 
-            build_index_circ(0, window_size, w, anc, o, x_circs, quantum_circuit)
+            load_data(quantum_circuit, planes, w, anc, o, differential)
 
         case 1:
             quantum_circuit = QuantumCircuit(w, o)
             quantum_circuit.name = "QROM"
 
-            output_str = get_output_string(e_table,outBits)
-
-            for i in range(len(output_str)):
-                tfc_circ_str = executa_sintese(n=window_size, tabela_saida=output_str[i]).__repr__()
-                quantum_circuit.append(tfc_str_to_qiskit(tfc_circ_str, window_size), w[:] + o[i:i+1])
+            mask = dont_care if dont_care.any() else None
+
+            if time_budget is not None:
+                circuit, strategy = executa_sintese_com_orcamento(window_size, planes.T, time_budget, mascara=mask)
+                quantum_circuit.append(circuito_to_qiskit(circuit, window_size), w[:] + o[:])
+                quantum_circuit.metadata["synthesis_strategy"] = strategy
+            elif shared_terms:
+                circuit = executa_sintese_com_cache(window_size, planes.T, "b", None, mask, True)
+                if optimize_time is not None:
+                    circuit = otimiza_circuito(circuit, optimize_time)[0]
+                quantum_circuit.append(circuito_to_qiskit(circuit, window_size), w[:] + o[:])
+            else:
+                circuits = synthesize_output_bits(window_size, planes, max_workers, executor, mask)
+                if optimize_time is not None:
+                    circuits = [otimiza_circuito(circuit, optimize_time)[0] for circuit in circuits]
+
+                for i in range(outBits):
+                    quantum_circuit.append(circuito_to_qiskit(circuits[i], window_size), w[:] + o[i:i+1])
 
         case 2:
-            quantum_circuit = QuantumCircuit(w, o)
+            if controlled:
+                ctrl = QuantumRegister(1, "ctrl")
+                quantum_circuit = QuantumCircuit(ctrl, w, o)
+                perm_qubits = ctrl[:] + w[:]
+            else:
+                quantum_circuit = QuantumCircuit(w, o)
+                perm_qubits = w[:]
             quantum_circuit.name = "QROM"
             #l should be the permutation list, the least significant outBits from each number in l should be the original values
             #window size can be greater than 2*outBits because of the nature of the permutation, so to ensure correct results
             #we only initialize the first 2*outBits with Haddamard gates, and only measure the first outBits
-            perm_circ = cria_circuito_sintese_nova(window_size, l)
-            quantum_circuit.append(perm_circ, w[:])
+            if dont_care.any() or len(l) < 1 << window_size:
+                l = complete_permutation(list(l), window_size)
+            perm_circ = cria_circuito_sintese_nova(window_size, l, controlado=controlled, bidirecional=bidirectional)
+            quantum_circuit.append(perm_circ, perm_qubits)
+
+        case 3:
+            if block_size is None:
+                block_size = choose_block_size(window_size, outBits)
+            k = check_block_size(window_size, block_size)
+
+            # address bits, least significant first (as in optimization 1)
+            high = w[k:][::-1]
+            anc = QuantumRegister(len(high)+1, "anc")
+            junk = QuantumRegister(block_size*outBits, "qroam")
+            quantum_circuit = QuantumCircuit(w, anc, junk, o)
+            quantum_circuit.name = "QROAM"
+
+            def block(r):
+                return junk[r*outBits:(r+1)*outBits]
 
-    return quantum_circuit
\ No newline at end of file
+            # block h as a single entry: row r*outBits + bit holds bit `bit` of l[h*block_size + r]
+            padded = np.zeros((outBits, 1 << window_size), dtype=np.uint8)
+            padded[:, :planes.shape[1]] = planes[:, :1 << window_size]
+            blocks = padded.reshape(outBits, -1, block_size).transpose(2, 0, 1).reshape(block_size*outBits, -1)
+
+            select = QuantumCircuit(w, anc, junk)
+            load_data(select, blocks, high, anc, junk, differential)
+
+            swap = QuantumCircuit(w, anc, junk)
+            for b in range(k-1, -1, -1):
+                for r in range(1 << b):
+                    for q0, q1 in zip(block(r), block(r + (1 << b))):
+                        swap.cswap(w[b], q0, q1)
+
+            quantum_circuit.compose(select, qubits=w[:] + anc[:] + junk[:], inplace=True)
+            quantum_circuit.compose(swap, qubits=w[:] + anc[:] + junk[:], inplace=True)
+            quantum_circuit.cx(block(0), o)
+            quantum_circuit.compose(swap.inverse(), qubits=w[:] + anc[:] + junk[:], inplace=True)
+            quantum_circuit.compose(select, qubits=w[:] + anc[:] + junk[:], inplace=True)
+
+        case _:
+            raise ValueError(f"Unknown optimization level {optimization}.")
+
+    return quantum_circuit
+
+
+def check_block_size(window_size: int, block_size: int) -> int:
+    """Checks that `block_size` is a valid QROAM block size for the window and returns its logarithm.
+
+    Args:
+        window_size (int): input (window) size in bits.
+        block_size (int): the number of entries loaded at once.
+
+    Returns:
+        k(int): `log2(block_size)`.
+    """
+    if block_size < 1 or block_size & (block_size - 1) or block_size > 1 << window_size:
+        raise ValueError(f"block_size must be a power of two between 1 and 2^{window_size}, got {block_size}.")
+    return block_size.bit_length() - 1
+
+
+def qroam_cost(window_size: int, outBits: int, block_size: int) -> tuple[int, int]:
+    """Toffoli count and number of qubits of the QROAM lookup (`optimization = 3`) built with `block_size`.
+
+    Exemple:
+    -
+    `qroam_cost(12, 32, 16) -> (1980, 565)`
+
+    Args:
+        window_size (int): input (window) size in bits.
+        outBits (int): output size in bits.
+        block_size (int): the number of entries loaded at once.
+
+    Returns:
+        (toffolis, qubits)(tuple[int, int]): the Toffoli (and controlled-swap) count and the total number of qubits, including input and output.
+    """
+    k = check_block_size(window_size, block_size)
+    toffolis = 4*((1 << (window_size - k)) - 1) + 2*(block_size - 1)*outBits
+    qubits = window_size + (window_size - k + 1) + block_size*outBits + outBits
+    return toffolis, qubits
+
+
+def choose_block_size(window_size: int, outBits: int, cost=None, max_qubits: int | None = None) -> int:
+    """Picks the QROAM block size minimizing `cost`.
+
+    Exemple:
+    -
+    `choose_block_size(12, 32) -> 16`
+
+    `choose_block_size(12, 32, cost=lambda toffolis, qubits: toffolis * qubits) -> 8`
+
+    Args:
+        window_size (int): input (window) size in bits.
+        outBits (int): output size in bits.
+        cost (Callable[[int, int], float] | None): function of `(toffolis, qubits)` to be minimized, `default = None` (the Toffoli count).
+        max_qubits (int | None): discards the block sizes needing more than `max_qubits` qubits, `default = None` (no limit).
+
+    Returns:
+        block_size(int): the best block size, `1` if none fits in `max_qubits`.
+    """
+    if cost is None:
+        cost = lambda toffolis, qubits: toffolis
+
+    best, best_cost = 1, None
+    for k in range(window_size + 1):
+        toffolis, qubits = qroam_cost(window_size, outBits, 1 << k)
+        if max_qubits is not None and qubits > max_qubits:
+            continue
+        c = cost(toffolis, qubits)
+        if best_cost is None or c < best_cost:
+            best, best_cost = 1 << k, c
+    return best
+
+
+def measurement_uncompute_lookup(window_size: int, outBits: int, l: list[int], optimization: int = 1) -> QuantumCircuit:
+    """Uncomputes a lookup-table(QROM) output register by measurement`[1]`, instead of running the lookup backwards.
+
+    The output register is measured in the X basis, which leaves the result `m` in the classical register `c` and
+    the phase `(-1)^(m·l[a])` on each address `a`. The phase is fixed by a classically controlled phase lookup,
+    a unary iteration over all address bits but the least significant one, where every leaf applies `Z` and `CZ`
+    (with the least significant address bit) conditioned on the measured bits. The fixup costs half the Toffolis
+    of the lookup, so uncomputing this way halves the total Toffoli count of a compute/uncompute pair.
+
+    Complexity:
+    -
+    Number of bits per register:
+
+    - `w`, input register (window), takes `window_size` bits.
+    - `anc`, ancilla register, takes `window_size` bits and is returned clean.
+    - `out`, output register to be cleared, takes `outBits` bits.
+    - `c`, classical register receiving the measurement, takes `outBits` bits.
+
+    Args:
+        window_size (int): input (window) size in bits.
+        outBits (int): output size in bits.
+        l (list[int]): list computed by the lookup being uncomputed.
+        optimization (int): optimization level of the lookup being uncomputed, it defines the order of the address bits (`3` uses the same order as `1`), `default = 1`.
+
+    Returns:
+        quantum_circuit(QuantumCircuit): the circuit clearing the output register of the lookup.
+
+    Reference:
+    -
+    [1]Qubitization of Arbitrary Basis Quantum Chemistry Leveraging Sparsity and Low Rank Factorization (appendix C).
+    Dominic W. Berry, Craig Gidney, Mario Motta, Jarrod R. McClean, and Ryan Babbush
+    """
+    if optimization not in (0, 1, 3):
+        raise ValueError("Measurement based uncomputation is only available for lookups with optimization 0, 1 or 3.")
+    if any(v is None for v in l):
+        raise ValueError("Measurement based uncomputation needs the value of every entry, the table has don't cares.")
+
+    w = QuantumRegister(window_size, name="w")
+    anc = QuantumRegister(window_size, "anc")
+    o = QuantumRegister(outBits, name="out")
+    c = ClassicalRegister(outBits, name="c")
+    quantum_circuit = QuantumCircuit(w, anc, o, c)
+    quantum_circuit.name = "QROM_uncompute"
+
+    quantum_circuit.h(o)
+    quantum_circuit.measure(o, c)
+    quantum_circuit.reset(o)
+
+    if window_size == 0:
+        return quantum_circuit
+
+    # address bits, most significant first
+    address = w[:] if optimization == 0 else w[::-1]
+    low = address[-1]
+
+    planes = encode_bit_planes(l, outBits)
+    entries = planes.shape[1]
+
+    quantum_circuit.x(anc[0])
+    for level, index, qubit in unary_iteration(quantum_circuit, address[:-1], anc):
+        if level < window_size - 1:
+            continue
+        even = planes[:, 2*index] if 2*index < entries else np.zeros(outBits, dtype=np.uint8)
+        odd = planes[:, 2*index+1] if 2*index+1 < entries else np.zeros(outBits, dtype=np.uint8)
+        for bit in np.flatnonzero(even | odd):
+            with quantum_circuit.if_test((c[int(bit)], 1)):
+                if even[bit]:
+                    quantum_circuit.z(qubit)
+                if even[bit] != odd[bit]:
+                    quantum_circuit.cz(qubit, low)
+    quantum_circuit.x(anc[0])
+
+    return quantum_circuit
+
+
+def lookup_ancillas(window_size: int, outBits: int, optimization: int = 1, block_size: int | None = None, uncompute: str = "inverse") -> int:
+    """Number of ancilla qubits needed to compute and uncompute a lookup with `compute_lookup` and `uncompute_lookup`.
+
+    Args:
+        window_size (int): input (window) size in bits.
+        outBits (int): output size in bits.
+        optimization (int): the level of optimization of the lookup, `default = 1`.
+        block_size (int | None): the block size of the lookup (only with `optimization = 3`), `default = None` (picked by `choose_block_size`).
+        uncompute (str): `"inverse"` (default) or `"measurement"`, how the lookup is uncomputed.
+
+    Returns:
+        ancillas(int): the number of ancilla qubits, shared between the computation and the uncomputation.
+    """
+    ancillas = 0
+    if optimization == 0:
+        ancillas = window_size + 1
+    elif optimization == 3:
+        if block_size is None:
+            block_size = choose_block_size(window_size, outBits)
+        ancillas = qroam_cost(window_size, outBits, block_size)[1] - window_size - outBits
+    if uncompute == "measurement":
+        ancillas = max(ancillas, window_size)
+    return ancillas
+
+
+def lookup_qubits(lookup: QuantumCircuit, address: list, target: list, anc: list = None, control: list = None) -> list:
+    """Lists the qubits a lookup circuit acts on: its `w` register is mapped to `address`, its `out` register to `target`,
+    its `ctrl` register (controlled lookups) to `control` and every other (ancilla) register, in order, to the first qubits of `anc`.
+
+    Args:
+        lookup (QuantumCircuit): a circuit built by `compute_lookup_table` or `measurement_uncompute_lookup`, or its inverse.
+        address (list): the address (window) qubits.
+        target (list): the output qubits of the lookup.
+        anc (list): ancilla qubits, at least `lookup_ancillas` of them.
+        control (list): the control qubit of a lookup built with `controlled = True`.
+
+    Returns:
+        qubits(list): the qubits to append `lookup` on.
+    """
+    anc = [] if anc is None else list(anc)
+    qubits = list()
+    used = 0
+    for reg in lookup.qregs:
+        if reg.name == "w":
+            qubits += list(address)
+        elif reg.name == "out":
+            qubits += list(target)
+        elif reg.name == "ctrl":
+            if control is None:
+                raise ValueError("The lookup is controlled, but no control qubit was given.")
+            qubits += list(control)
+        else:
+            if used + reg.size > len(anc):
+                raise ValueError(f"The lookup needs more ancilla qubits than the {len(anc)} given.")
+            qubits += anc[used:used + reg.size]
+            used += reg.size
+    return qubits
+
+
+def compute_lookup(quantum_circuit: QuantumCircuit, lookup: QuantumCircuit, address: list, target: list, anc: list = None, control: list = None) -> None:
+    """Appends a lookup returned by `compute_lookup_table_pair` into `quantum_circuit`.
+
+    Args:
+        quantum_circuit (QuantumCircuit): the circuit being built.
+        lookup (QuantumCircuit): the lookup-table.
+        address (list): the address (window) qubits.
+        target (list): the output qubits of the lookup.
+        anc (list): ancilla qubits, only used by lookups with `optimization = 0` or `3`.
+        control (list): the control qubit, only used by lookups built with `controlled = True`.
+    """
+    quantum_circuit.append(lookup, lookup_qubits(lookup, address, target, anc, control))
+
+
+def uncompute_lookup(quantum_circuit: QuantumCircuit, uncompute: QuantumCircuit, address: list, target: list, anc: list = None, clbits: list = None, control: list = None) -> None:
+    """Appends the uncomputation of a lookup returned by `compute_lookup_table_pair` into `quantum_circuit`.
+
+    Args:
+        quantum_circuit (QuantumCircuit): the circuit being built.
+        uncompute (QuantumCircuit): the inverse lookup, or the circuit built by `measurement_uncompute_lookup`.
+        address (list): the address (window) qubits.
+        target (list): the output qubits of the lookup.
+        anc (list): ancilla qubits, used by the measurement based uncomputation and by lookups with `optimization = 0` or `3`.
+        clbits (list): classical bits receiving the measurement, only used by the measurement based uncomputation.
+        control (list): the control qubit, only used by lookups built with `controlled = True`.
+    """
+    qubits = lookup_qubits(uncompute, address, target, anc, control)
+    if uncompute.num_clbits == 0:
+        quantum_circuit.append(uncompute, qubits)
+    else:
+        quantum_circuit.compose(uncompute, qubits=qubits, clbits=clbits, inplace=True)
+
+
+def compute_lookup_table_pair(window_size: int, outBits: int, l: list[int], optimization: int = 0, cache: LookupCache | None = None, max_workers: int | None = None, executor: str = "process", uncompute: str = "inverse", block_size: int | None = None, differential: bool = False, optimize_time: float | None = None, shared_terms: bool = False, time_budget: float | None = None, bidirectional: bool = False, controlled: bool = False) -> tuple[QuantumCircuit, QuantumCircuit]:
+    """Returns the lookup-table(QROM) computing `l` together with its inverse, reusing previously built circuits.
+
+    With `uncompute = "measurement"` the second circuit is the measurement based uncomputation built by
+    `measurement_uncompute_lookup` instead of the inverse, use `compute_lookup` and `uncompute_lookup` to append them.
+
+    The pair is stored in `cache` (`default_lookup_cache` when not given) keyed on
+    `(window_size, outBits, digest of l, optimization)`, so repeated or identical tables are synthesized only once.
+    The returned circuits are shared between calls and must not be modified in place, `append` them into other circuits.
+
+    Exemple:
+    -
+    `qrom, qrom_inv = compute_lookup_table_pair(w, n, table, optimization=1)`
+
+    Args:
+        window_size (int): input (window) size in bits.
+        outBits (int): output size in bits.
+        l (list[int]): list to be computed.
+        optimization (int): the level of optimization the circuit should have, `default = 0`.
+        cache (LookupCache | None): the cache to be used, `default = default_lookup_cache`.
+        max_workers (int | None): workers used to build the lookup on a cache miss, see `compute_lookup_table`.
+        executor (str): kind of pool used to build the lookup on a cache miss, see `compute_lookup_table`.
+        uncompute (str): `"inverse"` (default) or `"measurement"`, how the lookup is uncomputed.
+        block_size (int | None): the block size of the lookup with `optimization = 3`, see `compute_lookup_table`.
+        differential (bool): use the differential data loading, see `compute_lookup_table`.
+        optimize_time (float | None): time budget of the peephole optimization, see `compute_lookup_table`.
+        shared_terms (bool): synthesize the output bits as a single network, see `compute_lookup_table`.
+        time_budget (float | None): bound on the synthesis time, see `compute_lookup_table`.
+        bidirectional (bool): use the bidirectional permutation synthesis with `optimization = 2`, see `compute_lookup_table`.
+        controlled (bool): add a control qubit to the lookup with `optimization = 2`, see `compute_lookup_table`.
+
+    Returns:
+        (qrom, qrom_inv)(tuple[QuantumCircuit, QuantumCircuit]): the lookup-table and its inverse (or its measurement based uncomputation).
+    """
+    if cache is None:
+        cache = default_lookup_cache
+
+    if uncompute not in ("inverse", "measurement"):
+        raise ValueError(f"Unknown uncompute mode '{uncompute}', use 'inverse' or 'measurement'.")
+
+    if controlled and uncompute == "measurement":
+        raise ValueError("The measurement based uncomputation of a controlled lookup is not supported.")
+
+    if optimization == 3 and block_size is None:
+        block_size = choose_block_size(window_size, outBits)
+
+    key = cache.make_key(window_size, outBits, l, optimization, uncompute, block_size, differential, optimize_time, shared_terms, time_budget, bidirectional, controlled)
+    pair = cache.get(key)
+    if pair is None:
+        qrom = compute_lookup_table(window_size, outBits, list(l), optimization=optimization, max_workers=max_workers,
+                                    executor=executor, block_size=block_size, differential=differential,
+                                    optimize_time=optimize_time, shared_terms=shared_terms, time_budget=time_budget,
+                                    bidirectional=bidirectional, controlled=controlled)
+        if uncompute == "measurement":
+            pair = (qrom, measurement_uncompute_lookup(window_size, outBits, l, optimization=optimization))
+        else:
+            pair = (qrom, qrom.inverse())
+        cache.put(key, pair)
+    return pair
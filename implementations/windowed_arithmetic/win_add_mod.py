@@ -1,15 +1,19 @@
 from qiskit import *
 from arithmetic_operations.CDKM.adder_CDKM import mod_adder_CDKM_VBE
 from math import log2
-from table_lookup import compute_lookup_table
+from table_lookup import compute_lookup_table_pair, compute_lookup, uncompute_lookup, lookup_ancillas
 
-def win_add_mod(N: int, w: int, n: int, k: int) -> QuantumCircuit:
+def win_add_mod(N: int, w: int, n: int, k: int, uncompute: str = "inverse", optimization: int = 1, block_size: int | None = None) -> QuantumCircuit:
     """
     Args:
         N (int): the modulus.
         w (int): the addition window size.
         n (int): bit size of the operand.
         k (int): constant to multiply y.
+        uncompute (str): how the lookups are uncomputed, `"inverse"` (default) or `"measurement"`
+            (X basis measurement and phase fixup, adds `w` ancillas and `n` classical bits).
+        optimization (int): optimization level of the lookups, `1` (default, synthesized) or `3` (SELECT-SWAP, adds `lookup_ancillas` ancillas).
+        block_size (int | None): block size of the lookups with `optimization = 3`, `default = None` (picked by `choose_block_size`).
         
     Returns:
         quantum_circuit (QuantumCircuit): the plus equal product mod `x += ky mod N` circuit.
@@ -24,6 +28,18 @@ def win_add_mod(N: int, w: int, n: int, k: int) -> QuantumCircuit:
 
     quantum_circuit = QuantumCircuit(reg_anc,reg_y, reg_t, reg_o, name="win_add_mod")
 
+    if optimization not in (1, 3):
+        raise ValueError(f"the windowed lookups need an optimization level with a least significant first address (1 or 3), got {optimization}.")
+
+    reg_lanc, reg_m = None, None
+    ancillas = lookup_ancillas(w, n, optimization=optimization, block_size=block_size, uncompute=uncompute)
+    if ancillas:
+        reg_lanc = QuantumRegister(ancillas, 'lookup anc')
+        quantum_circuit.add_register(reg_lanc)
+    if uncompute == "measurement":
+        reg_m = ClassicalRegister(n, 'uncompute m')
+        quantum_circuit.add_register(reg_m)
+
 
     #anc, a, b, cO, n, help
 
@@ -33,10 +49,10 @@ def win_add_mod(N: int, w: int, n: int, k: int) -> QuantumCircuit:
         #target += table[win]
     for i in range(0, n, w):
         table = [j * k * 2**i % N for j in range(2**w)]
-        qrom = compute_lookup_table(w, n, table, optimization=1)
-        quantum_circuit.append(qrom, reg_y[i:i + w] + reg_t[:])
+        qrom, qrom_inv = compute_lookup_table_pair(w, n, table, optimization=optimization, uncompute=uncompute, block_size=block_size)
+        compute_lookup(quantum_circuit, qrom, reg_y[i:i + w], reg_t[:], reg_lanc)
         quantum_circuit.append(mod_adder_CDKM_VBE(n, N), reg_anc[0:1] + reg_t[:] + reg_o[:] + reg_anc[1:])
-        quantum_circuit.append(qrom.inverse(), reg_y[i:i + w] + reg_t[:])
+        uncompute_lookup(quantum_circuit, qrom_inv, reg_y[i:i + w], reg_t[:], reg_lanc, reg_m)
         
         #xor qrom into targer
         #add target into out
@@ -1,5 +1,5 @@
 from qiskit import *
-from table_lookup import compute_lookup_table
+from table_lookup import compute_lookup_table_pair, compute_lookup, uncompute_lookup, lookup_ancillas
 from math import log2, ceil, pi
 from implementations.arithmetic_operations.CDKM.adder_CDKM import mod_adder_CDKM_VBE
 
@@ -18,7 +18,7 @@ def modinv(a: int, n: int) -> int:
     return t
 
 
-def win_exp_mod(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0) -> QuantumCircuit:
+def win_exp_mod(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0, uncompute: str = "inverse", optimization: int = 1, block_size: int | None = None) -> QuantumCircuit:
     """Algorithm works by iterating over the exponent window, every iteration multiplies the result register by k^(2^(i)*current_window).
     example: 3^11, 11 in bin = 1011, with we=2, 2 windows = [10,11], [2,3]
     1 * 3^(2^0 * 3) = 27
@@ -31,6 +31,10 @@ def win_exp_mod(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0) -> Qu
         ne (int): exponent bit size.
         we (int): exponentiation window size.
         wm (int): multiplication window size.
+        uncompute (str): how the lookups are uncomputed, `"inverse"` (default) or `"measurement"`
+            (X basis measurement and phase fixup, adds `we+wm` ancillas and `n` classical bits).
+        optimization (int): optimization level of the lookups, `1` (default, synthesized) or `3` (SELECT-SWAP, adds `lookup_ancillas` ancillas).
+        block_size (int | None): block size of the lookups with `optimization = 3`, `default = None` (picked by `choose_block_size`).
 
     Returns:
         quantum_circuit (QuantumCircuit): the times equal exp mod `x *= k^e mod N` circuit.
@@ -47,6 +51,18 @@ def win_exp_mod(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0) -> Qu
 
     quantum_circuit = QuantumCircuit(reg_e, reg_a, reg_t, reg_o, reg_help, reg_anc, name="win_add_mod_expVer")
 
+    if optimization not in (1, 3):
+        raise ValueError(f"the windowed lookups need an optimization level with a least significant first address (1 or 3), got {optimization}.")
+
+    reg_lanc, reg_m = None, None
+    ancillas = lookup_ancillas(we+wm, n, optimization=optimization, block_size=block_size, uncompute=uncompute)
+    if ancillas:
+        reg_lanc = QuantumRegister(ancillas, name="lookup anc")
+        quantum_circuit.add_register(reg_lanc)
+    if uncompute == "measurement":
+        reg_m = ClassicalRegister(n, name="uncompute m")
+        quantum_circuit.add_register(reg_m)
+
     for i in range(0, ne, we):
         # Exponent - indexed factors and inverse factors .
         kes = [pow(k, 2**i * x, N) for x in range(2**we)]
@@ -55,24 +71,24 @@ def win_exp_mod(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0) -> Qu
 
         for j in range(0, n, wm):
             table = [(ke * f * 2**j) % N for f in range(2**wm) for ke in kes]
-            qrom = compute_lookup_table(we+wm, n, table, optimization=1)
-            quantum_circuit.append(qrom, reg_e[i:i + we] + reg_a[j:j + wm] + reg_t[:])
+            qrom, qrom_inv = compute_lookup_table_pair(we+wm, n, table, optimization=optimization, uncompute=uncompute, block_size=block_size)
+            compute_lookup(quantum_circuit, qrom, reg_e[i:i + we] + reg_a[j:j + wm], reg_t[:], reg_lanc)
             quantum_circuit.append(mod_adder_CDKM_VBE(n, N), reg_anc[0:1] + reg_t[:] + reg_o[:] + reg_help[:] + reg_anc[1:])
-            quantum_circuit.append(qrom.inverse(), reg_e[i:i + we] + reg_a[j:j + wm] + reg_t[:])
+            uncompute_lookup(quantum_circuit, qrom_inv, reg_e[i:i + we] + reg_a[j:j + wm], reg_t[:], reg_lanc, reg_m)
 
         for j in range(0, n, wm):
             table = [(ke_inv * f * 2**j) % N for f in  range(2**wm) for ke_inv in kes_inv]
-            qrom = compute_lookup_table(we+wm, n, table, optimization=1)
-            quantum_circuit.append(qrom, reg_e[i:i + we] + reg_o[j:j+wm] + reg_t[:])
+            qrom, qrom_inv = compute_lookup_table_pair(we+wm, n, table, optimization=optimization, uncompute=uncompute, block_size=block_size)
+            compute_lookup(quantum_circuit, qrom, reg_e[i:i + we] + reg_o[j:j+wm], reg_t[:], reg_lanc)
             quantum_circuit.append(mod_adder_CDKM_VBE(n, N).inverse(), reg_anc[0:1] + reg_t[:] + reg_a[:] + reg_help[:] + reg_anc[1:])
-            quantum_circuit.append(qrom.inverse(), reg_e[i:i + we] + reg_o[j:j+wm] + reg_t[:])
+            uncompute_lookup(quantum_circuit, qrom_inv, reg_e[i:i + we] + reg_o[j:j+wm], reg_t[:], reg_lanc, reg_m)
 
         quantum_circuit.swap(reg_a, reg_o)
 
     return quantum_circuit
 
 
-def win_exp_mod_reuse_e(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0) -> QuantumCircuit:
+def win_exp_mod_reuse_e(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0, uncompute: str = "inverse", optimization: int = 1, block_size: int | None = None) -> QuantumCircuit:
     """Algorithm works by iterating over the exponent window, every iteration multiplies the result register by k^(2^(i)*current_window).
     example: 3^11, 11 in bin = 1011, with we=2, 2 windows = [10,11], [2,3]
     1 * 3^(2^0 * 3) = 27
@@ -85,6 +101,10 @@ def win_exp_mod_reuse_e(N: int, k: int, n: int, ne: int, we: int = 0, wm: int =
         ne (int): exponent bit size.
         we (int): exponentiation window size.
         wm (int): multiplication window size.
+        uncompute (str): how the lookups are uncomputed, `"inverse"` (default) or `"measurement"`
+            (X basis measurement and phase fixup, adds `we+wm` ancillas and `n` classical bits).
+        optimization (int): optimization level of the lookups, `1` (default, synthesized) or `3` (SELECT-SWAP, adds `lookup_ancillas` ancillas).
+        block_size (int | None): block size of the lookups with `optimization = 3`, `default = None` (picked by `choose_block_size`).
 
     Returns:
         quantum_circuit (QuantumCircuit): the times equal exp mod `x *= k^e mod N` circuit.
@@ -102,6 +122,18 @@ def win_exp_mod_reuse_e(N: int, k: int, n: int, ne: int, we: int = 0, wm: int =
 
     quantum_circuit = QuantumCircuit(reg_e, reg_a, reg_t, reg_o, reg_help, reg_anc, reg_c, name="win_add_mod_expVer")
 
+    if optimization not in (1, 3):
+        raise ValueError(f"the windowed lookups need an optimization level with a least significant first address (1 or 3), got {optimization}.")
+
+    reg_lanc, reg_m = None, None
+    ancillas = lookup_ancillas(we+wm, n, optimization=optimization, block_size=block_size, uncompute=uncompute)
+    if ancillas:
+        reg_lanc = QuantumRegister(ancillas, name="lookup anc")
+        quantum_circuit.add_register(reg_lanc)
+    if uncompute == "measurement":
+        reg_m = ClassicalRegister(n, name="uncompute m")
+        quantum_circuit.add_register(reg_m)
+
     quantum_circuit.x(reg_a[0])
 
     for i in range(0, ne, we):
@@ -113,17 +145,17 @@ def win_exp_mod_reuse_e(N: int, k: int, n: int, ne: int, we: int = 0, wm: int =
 
         for j in range(0, n, wm):
             table = [(ke * f * 2**j) % N for f in range(2**wm) for ke in kes]
-            qrom = compute_lookup_table(we+wm, n, table, optimization=1)
-            quantum_circuit.append(qrom, reg_e[:] + reg_a[j:j + wm] + reg_t[:])
+            qrom, qrom_inv = compute_lookup_table_pair(we+wm, n, table, optimization=optimization, uncompute=uncompute, block_size=block_size)
+            compute_lookup(quantum_circuit, qrom, reg_e[:] + reg_a[j:j + wm], reg_t[:], reg_lanc)
             quantum_circuit.append(mod_adder_CDKM_VBE(n, N), reg_anc[0:1] + reg_t[:] + reg_o[:] + reg_help[:] + reg_anc[1:])
-            quantum_circuit.append(qrom.inverse(), reg_e[:] + reg_a[j:j + wm] + reg_t[:])
+            uncompute_lookup(quantum_circuit, qrom_inv, reg_e[:] + reg_a[j:j + wm], reg_t[:], reg_lanc, reg_m)
 
         for j in range(0, n, wm):
             table = [(ke_inv * f * 2**j) % N for f in  range(2**wm) for ke_inv in kes_inv]
-            qrom = compute_lookup_table(we+wm, n, table, optimization=1)
-            quantum_circuit.append(qrom, reg_e[:] + reg_o[j:j+wm] + reg_t[:])
+            qrom, qrom_inv = compute_lookup_table_pair(we+wm, n, table, optimization=optimization, uncompute=uncompute, block_size=block_size)
+            compute_lookup(quantum_circuit, qrom, reg_e[:] + reg_o[j:j+wm], reg_t[:], reg_lanc)
             quantum_circuit.append(mod_adder_CDKM_VBE(n, N).inverse(), reg_anc[0:1] + reg_t[:] + reg_a[:] + reg_help[:] + reg_anc[1:])
-            quantum_circuit.append(qrom.inverse(), reg_e[:] + reg_o[j:j+wm] + reg_t[:])
+            uncompute_lookup(quantum_circuit, qrom_inv, reg_e[:] + reg_o[j:j+wm], reg_t[:], reg_lanc, reg_m)
 
         quantum_circuit.swap(reg_a, reg_o)
 
@@ -135,7 +167,7 @@ def win_exp_mod_reuse_e(N: int, k: int, n: int, ne: int, we: int = 0, wm: int =
     return quantum_circuit
 
 
-def win_exp_mod_semi_class(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0) -> QuantumCircuit:
+def win_exp_mod_semi_class(N: int, k: int, n: int, ne: int, we: int = 0, wm: int = 0, uncompute: str = "inverse", optimization: int = 1, block_size: int | None = None) -> QuantumCircuit:
     """Algorithm works by iterating over the exponent window, every iteration multiplies the result register by k^(2^(i)*current_window).
     example: 3^11, 11 in bin = 1011, with we=2, 2 windows = [10,11], [2,3]
     1 * 3^(2^0 * 3) = 27
@@ -148,6 +180,10 @@ def win_exp_mod_semi_class(N: int, k: int, n: int, ne: int, we: int = 0, wm: int
         ne (int): exponent bit size.
         we (int): exponentiation window size.
         wm (int): multiplication window size.
+        uncompute (str): how the lookups are uncomputed, `"inverse"` (default) or `"measurement"`
+            (X basis measurement and phase fixup, adds `we+wm` ancillas and `n` classical bits).
+        optimization (int): optimization level of the lookups, `1` (default, synthesized) or `3` (SELECT-SWAP, adds `lookup_ancillas` ancillas).
+        block_size (int | None): block size of the lookups with `optimization = 3`, `default = None` (picked by `choose_block_size`).
 
     Returns:
         quantum_circuit (QuantumCircuit): the times equal exp mod `x *= k^e mod N` circuit.
@@ -165,6 +201,18 @@ def win_exp_mod_semi_class(N: int, k: int, n: int, ne: int, we: int = 0, wm: int
 
     quantum_circuit = QuantumCircuit(reg_e, reg_a, reg_t, reg_o, reg_help, reg_anc, reg_c, name="win_add_mod_expVer")
 
+    if optimization not in (1, 3):
+        raise ValueError(f"the windowed lookups need an optimization level with a least significant first address (1 or 3), got {optimization}.")
+
+    reg_lanc, reg_m = None, None
+    ancillas = lookup_ancillas(we+wm, n, optimization=optimization, block_size=block_size, uncompute=uncompute)
+    if ancillas:
+        reg_lanc = QuantumRegister(ancillas, name="lookup anc")
+        quantum_circuit.add_register(reg_lanc)
+    if uncompute == "measurement":
+        reg_m = ClassicalRegister(n, name="uncompute m")
+        quantum_circuit.add_register(reg_m)
+
     quantum_circuit.x(reg_a[0])
 
     for i in range(ne-we, -1, -we):
@@ -178,17 +226,17 @@ def win_exp_mod_semi_class(N: int, k: int, n: int, ne: int, we: int = 0, wm: int
 
         for j in range(0, n, wm):
             table = [(ke * f * 2**j) % N for f in range(2**wm) for ke in kes]
-            qrom = compute_lookup_table(we+wm, n, table, optimization=1)
-            quantum_circuit.append(qrom, reg_e[:] + reg_a[j:j + wm] + reg_t[:])
+            qrom, qrom_inv = compute_lookup_table_pair(we+wm, n, table, optimization=optimization, uncompute=uncompute, block_size=block_size)
+            compute_lookup(quantum_circuit, qrom, reg_e[:] + reg_a[j:j + wm], reg_t[:], reg_lanc)
             quantum_circuit.append(mod_adder_CDKM_VBE(n, N), reg_anc[0:1] + reg_t[:] + reg_o[:] + reg_help[:] + reg_anc[1:])
-            quantum_circuit.append(qrom.inverse(), reg_e[:] + reg_a[j:j + wm] + reg_t[:])
+            uncompute_lookup(quantum_circuit, qrom_inv, reg_e[:] + reg_a[j:j + wm], reg_t[:], reg_lanc, reg_m)
 
         for j in range(0, n, wm):
             table = [(ke_inv * f * 2**j) % N for f in range(2**wm) for ke_inv in kes_inv]
-            qrom = compute_lookup_table(we+wm, n, table, optimization=1)
-            quantum_circuit.append(qrom, reg_e[:] + reg_o[j:j+wm] + reg_t[:])
+            qrom, qrom_inv = compute_lookup_table_pair(we+wm, n, table, optimization=optimization, uncompute=uncompute, block_size=block_size)
+            compute_lookup(quantum_circuit, qrom, reg_e[:] + reg_o[j:j+wm], reg_t[:], reg_lanc)
             quantum_circuit.append(mod_adder_CDKM_VBE(n, N).inverse(), reg_anc[0:1] + reg_t[:] + reg_a[:] + reg_help[:] + reg_anc[1:])
-            quantum_circuit.append(qrom.inverse(), reg_e[:] + reg_o[j:j+wm] + reg_t[:])
+            uncompute_lookup(quantum_circuit, qrom_inv, reg_e[:] + reg_o[j:j+wm], reg_t[:], reg_lanc, reg_m)
 
         quantum_circuit.swap(reg_a, reg_o)
 